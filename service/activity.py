@@ -0,0 +1,136 @@
+"""
+Buffered recording of login activity.
+
+Login attempts are kept in memory and written in batches: one bulk INSERT of the
+activity rows and one last_login UPDATE per user, however many times the user logged in.
+The buffer is flushed when it holds LOGIN_ACTIVITY_BUFFER_SIZE events, when the oldest
+event is older than LOGIN_ACTIVITY_FLUSH_INTERVAL seconds, and on process exit. The age
+is checked by a background thread (LOGIN_ACTIVITY_FLUSH_THREAD, under uWSGI only with
+the enable-threads option), else on the next login.
+So a crashed worker loses at most LOGIN_ACTIVITY_BUFFER_SIZE events, set it to 1 to write through.
+"""
+import atexit
+import logging
+import os
+import threading
+import time
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.utils import timezone
+from service.cache import user_cache
+from service.shared import threads_enabled
+
+logger = logging.getLogger(__name__)
+
+class ActivityRecorder(object):
+    """
+    Buffers login events and writes them in batches.
+    """
+    def __init__(self):
+        self._events = []
+        self._oldest = None
+        self._lock = threading.Lock()
+        self._pid = None
+
+    def record(self, user, email, ip_address, success):
+        """
+        Records login attempt. Returns time of the attempt.
+        """
+        from service.models import LoginActivity
+        now = timezone.now()
+        event = LoginActivity(user=user, email=email[:75], ip_address=ip_address, created=now, success=success)
+        with self._lock:
+            self._events.append(event)
+            if self._oldest is None:
+                self._oldest = time.time()
+            flush = len(self._events) >= settings.LOGIN_ACTIVITY_BUFFER_SIZE or self._due()
+        if flush:
+            self.flush()
+        else:
+            self._ensure_timer()
+        return now
+
+    def flush_if_due(self):
+        """
+        Writes all buffered events if the oldest one is older than LOGIN_ACTIVITY_FLUSH_INTERVAL.
+        """
+        with self._lock:
+            flush = self._due()
+        if flush:
+            self.flush()
+
+    def flush(self):
+        """
+        Writes all buffered events.
+        """
+        from service.models import LoginActivity
+        with self._lock:
+            events, self._events, self._oldest = self._events, [], None
+        if not events:
+            return
+        last_logins = {}
+        for event in events:
+            if event.success and event.user_id is not None:
+                last_logins[event.user_id] = max(event.created, last_logins.get(event.user_id, event.created))
+        with transaction.commit_on_success():
+            LoginActivity.objects.bulk_create(events)
+            for user_id, last_login in last_logins.items():
+                User.objects.filter(pk=user_id, last_login__lt=last_login).update(last_login=last_login)
+        for user_id in last_logins:
+            user_cache.invalidate(user_id)
+
+    def clear(self):
+        """
+        Drops all buffered events without writing them.
+        """
+        with self._lock:
+            self._events, self._oldest = [], None
+
+    def _due(self):
+        return self._oldest is not None and time.time() - self._oldest >= settings.LOGIN_ACTIVITY_FLUSH_INTERVAL
+
+    def _ensure_timer(self):
+        # Threads do not survive fork, so every worker process starts its own one.
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid != os.getpid():
+                if settings.LOGIN_ACTIVITY_FLUSH_THREAD and threads_enabled():
+                    thread = threading.Thread(target=self._run_timer, name='activity-flush')
+                    thread.daemon = True
+                    thread.start()
+                self._pid = os.getpid()
+
+    def _run_timer(self):
+        while True:
+            time.sleep(max(settings.LOGIN_ACTIVITY_FLUSH_INTERVAL / 2.0, 0.1))
+            try:
+                self.flush_if_due()
+            except Exception:
+                logger.exception('Failed to write login activity')
+
+    def __len__(self):
+        return len(self._events)
+
+recorder = ActivityRecorder()
+atexit.register(recorder.flush)
+
+try:
+    import uwsgi
+    uwsgi.atexit = recorder.flush
+except ImportError:
+    pass
+
+def get_client_ip(request):
+    return request.META.get('REMOTE_ADDR') or None
+
+def record_login(sender, request, user, **kwargs):
+    """
+    Receiver of the user_logged_in signal, it replaces django.contrib.auth.models.update_last_login
+    which saves the whole user row on every login.
+    """
+    user.last_login = recorder.record(user, user.email, get_client_ip(request), True)
+
+def record_failed_login(request, email):
+    recorder.record(None, unicode(email or ''), get_client_ip(request), False)
@@ -0,0 +1,188 @@
+from django.conf import settings
+from django.contrib import admin
+from django.contrib.admin.views.main import ChangeList, IGNORED_PARAMS
+from django.contrib.auth.admin import UserAdmin as DjangoUserAdmin
+from django.contrib.auth.models import User
+from django.db import models
+from service.models import UserProfile, UserStat
+
+AFTER_VAR = 'after'
+
+class KeysetChangeList(ChangeList):
+    """
+    Change list for big tables. It pages by primary key (?after=<pk>) instead of OFFSET, takes
+    the number of objects from the model admin's estimate instead of COUNT(*), and searches
+    by prefix with range lookups on the indexed 'prefix_search_fields' of the model admin.
+    Objects are always ordered by descending primary key.
+    """
+    def __init__(self, request, *args, **kwargs):
+        try:
+            self.after = int(request.GET[AFTER_VAR])
+        except (KeyError, ValueError):
+            self.after = None
+        super(KeysetChangeList, self).__init__(request, *args, **kwargs)
+
+    def get_ordering(self, request, queryset):
+        return ['-pk']
+
+    def get_query_set(self, request):
+        self.params.pop(AFTER_VAR, None)
+        query, self.query = self.query, ''
+        try:
+            qs = super(KeysetChangeList, self).get_query_set(request)
+        finally:
+            self.query = query
+        for bit in self.query.split():
+            or_queries = [models.Q(**{'%s__gte' % field: value, '%s__lt' % field: value + u'\uffff'})
+                          for field, value in self._prefix_lookups(bit)]
+            qs = qs.filter(reduce(lambda a, b: a | b, or_queries))
+        return qs
+
+    def _prefix_lookups(self, bit):
+        # Range lookups are case sensitive, so common spellings are looked up: as typed,
+        # in lower case and, for names, capitalized.
+        for field in self.model_admin.prefix_search_fields:
+            values = set([bit, bit.lower()])
+            if not field.endswith('email'):
+                values.add(bit.capitalize())
+            for value in values:
+                yield field, value
+
+    @property
+    def filter_params(self):
+        return dict((key, value) for key, value in self.params.items() if key not in IGNORED_PARAMS)
+
+    def get_results(self, request):
+        qs = self.query_set
+        if self.after is not None:
+            qs = qs.filter(pk__lt=self.after)
+        result_list = list(qs[:self.list_per_page + 1])
+        self.has_next = len(result_list) > self.list_per_page
+        self.result_list = result_list[:self.list_per_page]
+        self.next_after = self.result_list[-1].pk if self.has_next else None
+        estimated_count = self.model_admin.get_estimated_count(self)
+        if estimated_count is None:
+            estimated_count = len(self.result_list)
+        self.result_count = self.full_result_count = estimated_count
+        self.can_show_all = False
+        self.multi_page = self.has_next or self.after is not None
+        self.paginator = None
+
+    def next_page_url(self):
+        return self.get_query_string({AFTER_VAR: self.next_after}) if self.has_next else None
+
+    def first_page_url(self):
+        return self.get_query_string() if self.after is not None else None
+
+
+class KeysetAdminMixin(object):
+    """
+    Model admin mixin for KeysetChangeList.
+    """
+    prefix_search_fields = ()
+    change_list_template = 'admin/keyset_change_list.html'
+
+    def get_changelist(self, request, **kwargs):
+        return KeysetChangeList
+
+    def get_estimated_count(self, changelist):
+        """
+        Returns estimated number of objects of the change list or None if it's unknown.
+        """
+        return None
+
+
+class UserAdmin(KeysetAdminMixin, DjangoUserAdmin):
+    """
+    Users admin for big tables, see KeysetChangeList.
+    """
+    prefix_search_fields = ('email', 'first_name', 'last_name')
+
+    def get_estimated_count(self, changelist):
+        if changelist.filter_params or changelist.query:
+            return None
+        return UserStat.objects.get_value(UserStat.USERS, None)
+
+
+class VerifiedListFilter(admin.SimpleListFilter):
+    title = 'verified'
+    parameter_name = 'verified'
+
+    def lookups(self, request, model_admin):
+        return (('1', 'Yes'), ('0', 'No'))
+
+    def queryset(self, request, queryset):
+        if self.value() == '1':
+            return queryset.filter(verification_key=UserProfile.VERIFIED)
+        if self.value() == '0':
+            return queryset.exclude(verification_key=UserProfile.VERIFIED)
+
+
+class UserProfileAdmin(KeysetAdminMixin, admin.ModelAdmin):
+    """
+    Profiles admin for big tables, see KeysetChangeList. Bulk actions run as set-based operations.
+    """
+    list_display = ('id', 'email', 'first_name', 'last_name', 'is_verified', 'subscribed')
+    list_filter = (VerifiedListFilter, 'subscribed')
+    list_select_related = True
+    search_fields = ('user__email',)
+    prefix_search_fields = ('user__email', 'user__first_name', 'user__last_name')
+    raw_id_fields = ('user',)
+    actions = ['resend_verification', 'subscribe', 'unsubscribe']
+
+    def email(self, obj):
+        return obj.user.email
+
+    def first_name(self, obj):
+        return obj.user.first_name
+
+    def last_name(self, obj):
+        return obj.user.last_name
+
+    def is_verified(self, obj):
+        return obj.is_verified
+    is_verified.boolean = True
+    is_verified.short_description = 'Verified'
+
+    def get_estimated_count(self, changelist):
+        # A missing counter (e.g. before 'reconcile_user_stats' was run) is unknown, not 0.
+        params, profiles = changelist.filter_params, UserStat.objects.get_value(UserStat.PROFILES, None)
+        if changelist.query or len(params) > 1 or profiles is None:
+            return None
+        if not params:
+            return profiles
+        stats = {
+            ('verified', '1'): UserStat.VERIFIED,
+            ('subscribed__exact', '1'): UserStat.SUBSCRIBED,
+        }
+        key, value = params.items()[0]
+        if (key, value) in stats:
+            return UserStat.objects.get_value(stats[key, value], None)
+        if (key, '1') in stats and value == '0':
+            selected = UserStat.objects.get_value(stats[key, '1'], None)
+            return None if selected is None else profiles - selected
+        return None
+
+    def resend_verification(self, request, queryset):
+        if len(queryset.order_by().values_list('pk', flat=True)[:settings.VERIFICATION_RESEND_ADMIN_LIMIT + 1]) > \
+                settings.VERIFICATION_RESEND_ADMIN_LIMIT:
+            count = UserProfile.objects.request_verification_resend(queryset)
+            self.message_user(request, '%d verification emails will be sent in the background.' % count)
+            return
+        count = UserProfile.objects.resend_verification(queryset)
+        self.message_user(request, '%d verification emails queued.' % count)
+    resend_verification.short_description = 'Resend verification email'
+
+    def subscribe(self, request, queryset):
+        count = UserProfile.objects.update_subscribed(queryset, True)
+        self.message_user(request, '%d profiles subscribed.' % count)
+    subscribe.short_description = 'Subscribe selected profiles'
+
+    def unsubscribe(self, request, queryset):
+        count = UserProfile.objects.update_subscribed(queryset, False)
+        self.message_user(request, '%d profiles unsubscribed.' % count)
+    unsubscribe.short_description = 'Unsubscribe selected profiles'
+
+admin.site.unregister(User)
+admin.site.register(User, UserAdmin)
+admin.site.register(UserProfile, UserProfileAdmin)
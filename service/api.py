@@ -0,0 +1,235 @@
+"""
+JSON API for machine clients.
+
+Requests are POSTed as JSON (or as form data), responses are JSON. Clients get a token
+from the 'api_authenticate' or 'api_register' endpoint and pass it in the header:
+
+    Authorization: Token <token>
+
+Tokens are signed, so they are checked without a session or a token table. A token expires
+after API_TOKEN_MAX_AGE seconds and becomes invalid when the user changes the password.
+"""
+import json
+from datetime import timedelta
+from functools import wraps
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core import signing
+from django.http import HttpResponse
+from django.utils import timezone
+from django.utils.crypto import salted_hmac
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_POST
+from service.activity import recorder, get_client_ip, record_failed_login
+from service.cache import user_cache
+from service.events import wait_for_events, InvalidOffset
+from service.forms import EmailAuthenticationForm, RegistrationForm, PasswordChangeForm, SubscribeForm
+from service.models import UserProfile, UserStat
+
+TOKEN_SALT = 'service.api.token'
+
+def create_token(user):
+    """
+    Creates signed token for the user.
+    """
+    return signing.dumps([user.pk, _password_fingerprint(user)], salt=TOKEN_SALT)
+
+def get_token_user(token):
+    """
+    Returns active user of the token or None if the token is invalid or expired.
+    """
+    try:
+        user_id, fingerprint = signing.loads(token, salt=TOKEN_SALT, max_age=settings.API_TOKEN_MAX_AGE)
+    except (signing.BadSignature, TypeError, ValueError):
+        return None
+    try:
+        user = User.objects.get(pk=user_id, is_active=True)
+    except User.DoesNotExist:
+        return None
+    if _password_fingerprint(user) != fingerprint:
+        return None
+    return user
+
+def _password_fingerprint(user):
+    return salted_hmac(TOKEN_SALT, user.password).hexdigest()[:10]
+
+def json_response(data, status=200):
+    return HttpResponse(json.dumps(data), content_type='application/json', status=status)
+
+def error_response(errors, status=400):
+    return json_response({'errors': errors}, status=status)
+
+def form_errors(form):
+    return dict((field, [unicode(error) for error in errors]) for field, errors in form.errors.items())
+
+def api_view(func):
+    """
+    Decorator for API views: accepts POST only, without CSRF check, and parses JSON body into request.data
+    """
+    @csrf_exempt
+    @require_POST
+    @wraps(func)
+    def wrapper(request, *args, **kwargs):
+        if request.META.get('CONTENT_TYPE', '').startswith('application/json'):
+            try:
+                request.data = json.loads(request.body)
+            except ValueError:
+                return error_response({'__all__': ['Invalid JSON.']})
+            if not isinstance(request.data, dict):
+                return error_response({'__all__': ['JSON object expected.']})
+        else:
+            request.data = request.POST
+        return func(request, *args, **kwargs)
+    return wrapper
+
+def token_required(staff=False):
+    """
+    Decorator for API views that authenticates user by the token.
+    """
+    def decorator(func):
+        @wraps(func)
+        def wrapper(request, *args, **kwargs):
+            auth = request.META.get('HTTP_AUTHORIZATION', '').split()
+            user = get_token_user(auth[1]) if len(auth) == 2 and auth[0] == 'Token' else None
+            if user is None:
+                return error_response({'__all__': ['Invalid token.']}, status=401)
+            if staff and not user.is_staff:
+                return error_response({'__all__': ['Permission denied.']}, status=403)
+            request.user = user
+            return func(request, *args, **kwargs)
+        return wrapper
+    return decorator
+
+@api_view
+def register(request):
+    """
+    Registers new user. Returns id and token of the user.
+    """
+    form = RegistrationForm(request.data)
+    if not form.is_valid():
+        return error_response(form_errors(form))
+    user = form.register(auth=False)
+    return json_response({'id': user.pk, 'token': create_token(user)}, status=201)
+
+@api_view
+def authenticate(request):
+    """
+    Authenticates user by email and password. Returns id and token of the user.
+    """
+    form = EmailAuthenticationForm(data={'username': request.data.get('email'), 'password': request.data.get('password')})
+    if not form.is_valid():
+        record_failed_login(request, request.data.get('email'))
+        return error_response(form_errors(form), status=401)
+    user = form.get_user()
+    recorder.record(user, user.email, get_client_ip(request), True)
+    return json_response({'id': user.pk, 'token': create_token(user)})
+
+@api_view
+def verify(request):
+    """
+    Verifies user email by the verification key.
+    """
+    user = UserProfile.objects.verification(request.data.get('key', ''))
+    if not user:
+        return error_response({'key': ['Invalid verification key.']}, status=404)
+    return json_response({'id': user.pk})
+
+@api_view
+@token_required()
+def change_password(request):
+    """
+    Changes password of the token user. Returns new token, the old one becomes invalid.
+    """
+    form = PasswordChangeForm(request.user, request.data)
+    if not form.is_valid():
+        return error_response(form_errors(form))
+    user = form.save()
+    return json_response({'id': user.pk, 'token': create_token(user)})
+
+@api_view
+@token_required()
+def subscribe(request):
+    """
+    Subscribes or unsubscribes the token user.
+    """
+    form = SubscribeForm(request.user, request.data)
+    if not form.is_valid():
+        return error_response(form_errors(form))
+    user = form.save()
+    return json_response({'id': user.pk, 'subscribed': user.profile.subscribed})
+
+@api_view
+@token_required()
+def resend_verification(request):
+    """
+    Resends the verification email to the token user. Repeated requests within
+    VERIFICATION_RESEND_WINDOW seconds send one email.
+    """
+    profiles = UserProfile.objects.filter(user=request.user).exclude(verification_key=UserProfile.VERIFIED)
+    if not profiles.exists():
+        return error_response({'__all__': ['Email is already verified.']})
+    UserProfile.objects.resend_verification(profiles)
+    return json_response({'id': request.user.pk}, status=202)
+
+@api_view
+@token_required(staff=True)
+def subscribe_batch(request):
+    """
+    Subscribes or unsubscribes many users at once: {"user_ids": [1, 2, ...], "subscribe": true}
+    Returns number of updated users.
+    """
+    user_ids, subscribe = request.data.get('user_ids'), request.data.get('subscribe')
+    if not isinstance(user_ids, list) or not all(isinstance(user_id, (int, long)) for user_id in user_ids):
+        return error_response({'user_ids': ['List of user ids expected.']})
+    if not isinstance(subscribe, bool):
+        return error_response({'subscribe': ['Boolean expected.']})
+    return json_response({'updated': UserProfile.objects.set_subscribed(user_ids, subscribe)})
+
+@csrf_exempt
+@token_required(staff=True)
+def cache_stats(request):
+    """
+    Returns statistics of the user cache of the worker process which served the request.
+    """
+    return json_response({'users': user_cache.stats()})
+
+@csrf_exempt
+@token_required(staff=True)
+def user_stats(request):
+    """
+    Returns user counters and registrations per day for the last 'days' days (30 by default).
+    """
+    try:
+        days = min(max(int(request.GET.get('days', 30)), 1), 366)
+    except ValueError:
+        return error_response({'days': ['Number expected.']})
+    today = timezone.localtime(timezone.now()).date()
+    dates = [today - timedelta(days=i) for i in range(days)]
+    values = UserStat.objects.get_values([UserStat.USERS, UserStat.PROFILES, UserStat.VERIFIED, UserStat.SUBSCRIBED] +
+                                         [UserStat.registrations_key(date) for date in dates])
+    return json_response({
+        'users': values[UserStat.USERS],
+        'profiles': values[UserStat.PROFILES],
+        'verified': values[UserStat.VERIFIED],
+        'subscribed': values[UserStat.SUBSCRIBED],
+        'registrations': dict((date.isoformat(), values[UserStat.registrations_key(date)]) for date in dates),
+    })
+
+@csrf_exempt
+@token_required(staff=True)
+def events(request):
+    """
+    Long-polls the event log: returns up to 'limit' events from 'offset' and the offset to continue from.
+    When there are no events yet, waits for them up to 'timeout' seconds (EVENT_LOG_MAX_WAIT at most).
+    """
+    try:
+        offset = max(int(request.GET.get('offset', 0)), 0)
+        limit = min(max(int(request.GET.get('limit', 100)), 1), 1000)
+        timeout = min(max(float(request.GET.get('timeout', 0)), 0), settings.EVENT_LOG_MAX_WAIT)
+    except ValueError:
+        return error_response({'__all__': ['Numbers expected.']})
+    try:
+        events, next_offset = wait_for_events(offset, limit, timeout)
+    except InvalidOffset:
+        return error_response({'offset': ['Offset is not at the start of an event.']})
+    return json_response({'events': events, 'next_offset': next_offset})
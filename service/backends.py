@@ -1,4 +1,7 @@
 from django.contrib.auth.models import User
+from service.bloom import email_filter
+from service.cache import user_cache
+from service.models import UserProfile
 
 class EmailModelBackend(object):
     """
@@ -6,14 +9,18 @@ class EmailModelBackend(object):
     """
 
     def authenticate(self, username=None, password=None):
-        try:
-            user = User.objects.get(email=username)
+        if not email_filter.might_exist(username):
+            return None
+        # Emails are stored in lower case, emails of old users as they were typed.
+        for user in User.objects.filter(email__in=set([UserProfile.objects.normalize_email(username), username])):
             if user.check_password(password):
                 return user
-        except User.DoesNotExist:
-            return None
+        return None
 
     def get_user(self, user_id):
+        return user_cache.get(user_id, self._load_user)
+
+    def _load_user(self, user_id):
         try:
             return User.objects.get(pk=user_id)
         except User.DoesNotExist:
@@ -0,0 +1,159 @@
+"""
+Bloom filter of user emails.
+
+A negative answer of the filter is definite, so registration and authentication of
+unknown emails skip the database.
+"""
+import hashlib
+import math
+import struct
+import threading
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db import transaction
+from service.shared import SharedCounters
+
+class BloomFilter(object):
+    """
+    Bloom filter sized for the expected number of items and false positive rate.
+    """
+    def __init__(self, capacity, error_rate):
+        self.capacity, self.error_rate = capacity, error_rate
+        self.num_bits = int(math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.num_hashes = max(1, int(round(float(self.num_bits) / capacity * math.log(2))))
+        self.bits = bytearray((self.num_bits + 7) // 8)
+        self.count = 0
+
+    def _positions(self, value):
+        # Double hashing: k positions from two 64-bit halves of one md5 digest.
+        h1, h2 = struct.unpack('<QQ', hashlib.md5(value).digest())
+        return [(h1 + i * h2) % self.num_bits for i in xrange(self.num_hashes)]
+
+    def add(self, value):
+        for position in self._positions(value):
+            self.bits[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+    def __contains__(self, value):
+        bits = self.bits
+        for position in self._positions(value):
+            if not bits[position >> 3] & (1 << (position & 7)):
+                return False
+        return True
+
+    def __len__(self):
+        return self.count
+
+    @property
+    def memory_size(self):
+        return len(self.bits)
+
+    @property
+    def false_positive_rate(self):
+        """
+        Estimated false positive rate for the current number of items.
+        """
+        return (1 - math.exp(-float(self.num_hashes) * self.count / self.num_bits)) ** self.num_hashes
+
+
+class EmailFilter(object):
+    """
+    Bloom filter of normalized emails of all users, built on the first use by a streaming scan.
+
+    Processes of the node share the max id of registered users and a generation which is bumped
+    when an email is changed or a user is deleted, so emails added by other processes are picked
+    up without a query while nothing has changed.
+    """
+    LAST_USER_ID, GENERATION = 0, 1
+
+    def __init__(self):
+        self.shared = SharedCounters('email_filter', 2)
+        self._filter = None
+        self._last_user_id = 0
+        self._generation = None
+        self._lock = threading.RLock()
+        self._pending = threading.local()
+
+    @staticmethod
+    def normalize(email):
+        return (email or '').strip().lower().encode('utf-8')
+
+    def might_exist(self, email):
+        """
+        Returns False if no user has the email, True if some user may have it.
+        """
+        if not settings.EMAIL_FILTER_ENABLED:
+            return True
+        email = self.normalize(email)
+        with self._lock:
+            self._sync()
+            return email in self._filter
+
+    def add(self, user):
+        """
+        Adds email of the saved user, it's called from post_save of User.
+        """
+        if not settings.EMAIL_FILTER_ENABLED:
+            return
+        with self._lock:
+            if self._filter is not None:
+                self._filter.add(self.normalize(user.email))
+                if len(self._filter) > self._filter.capacity:
+                    self._filter = None
+        self.shared.update_max(self.LAST_USER_ID, user.pk)
+
+    def invalidate(self):
+        """
+        Makes all processes rebuild the filter, e.g. when an email is changed or a user is deleted. Inside a transaction
+        the generation is bumped again by invalidate_pending() when the request is finished: a process
+        which rebuilt the filter before the commit did not see the new email. Code changing emails
+        in a transaction outside a request must call invalidate() after the commit.
+        """
+        self.shared.increment(self.GENERATION)
+        if transaction.is_managed():
+            self._pending.invalidate = True
+
+    def invalidate_pending(self, **kwargs):
+        """
+        Receiver of request_finished, bumps the generation if an email was changed in a transaction.
+        """
+        if getattr(self._pending, 'invalidate', False):
+            self._pending.invalidate = False
+            self.shared.increment(self.GENERATION)
+
+    def build(self):
+        """
+        Builds the filter from all users.
+        """
+        with self._lock:
+            generation = self.shared.get(self.GENERATION)
+            capacity = max(settings.EMAIL_FILTER_CAPACITY, 2 * User.objects.count())
+            self._filter = BloomFilter(capacity, settings.EMAIL_FILTER_ERROR_RATE)
+            self._last_user_id, self._generation = 0, generation
+            self._add_users(User.objects.all())
+
+    def stats(self):
+        with self._lock:
+            if self._filter is None:
+                self.build()
+            return {
+                'emails': len(self._filter),
+                'capacity': self._filter.capacity,
+                'bits': self._filter.num_bits,
+                'hashes': self._filter.num_hashes,
+                'memory_size': self._filter.memory_size,
+                'false_positive_rate': self._filter.false_positive_rate,
+            }
+
+    def _sync(self):
+        if self._filter is None or self._generation != self.shared.get(self.GENERATION):
+            self.build()
+        elif self._last_user_id < self.shared.get(self.LAST_USER_ID):
+            self._add_users(User.objects.filter(pk__gt=self._last_user_id))
+
+    def _add_users(self, queryset):
+        for user_id, email in queryset.order_by().values_list('pk', 'email').iterator():
+            self._filter.add(self.normalize(email))
+            self._last_user_id = max(self._last_user_id, user_id)
+
+email_filter = EmailFilter()
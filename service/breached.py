@@ -0,0 +1,94 @@
+"""
+Local corpus of breached passwords.
+
+The corpus is a binary file of sorted SHA1 digests with a prefix bucket index:
+
+    header   8 bytes   magic 'TXTRPWD1'
+    index    65537 x uint32 (little endian), index[p] is the number of the first digest
+             whose first two bytes are >= p, index[65536] is the number of digests
+    digests  N x 20 bytes, sorted
+
+The file is opened with mmap, so the pages are shared by all worker processes through
+the page cache, and a lookup is a binary search inside one bucket.
+It's built from a text dump by the 'build_breached_passwords' command.
+"""
+import hashlib
+import mmap
+import struct
+import threading
+from django.conf import settings
+from django.core.exceptions import ValidationError
+
+MAGIC = 'TXTRPWD1'
+BUCKETS = 1 << 16
+INDEX_FORMAT = '<%dI' % (BUCKETS + 1)
+HEADER_SIZE = len(MAGIC) + struct.calcsize(INDEX_FORMAT)
+DIGEST_SIZE = 20
+
+class BreachedPasswords(object):
+    """
+    Memory-mapped corpus of breached password digests.
+    """
+    def __init__(self, path):
+        with open(path, 'rb') as corpus_file:
+            self._mmap = mmap.mmap(corpus_file.fileno(), 0, access=mmap.ACCESS_READ)
+        if self._mmap[:len(MAGIC)] != MAGIC:
+            raise ValueError('%s is not a breached passwords file' % path)
+        self._index = struct.unpack_from(INDEX_FORMAT, self._mmap, len(MAGIC))
+        if len(self._mmap) != HEADER_SIZE + self._index[-1] * DIGEST_SIZE:
+            raise ValueError('%s is truncated' % path)
+
+    def __len__(self):
+        return self._index[-1]
+
+    def contains_digest(self, digest):
+        bucket = struct.unpack('>H', digest[:2])[0]
+        low, high = self._index[bucket], self._index[bucket + 1]
+        data = self._mmap
+        while low < high:
+            middle = (low + high) // 2
+            offset = HEADER_SIZE + middle * DIGEST_SIZE
+            value = data[offset:offset + DIGEST_SIZE]
+            if value < digest:
+                low = middle + 1
+            elif value > digest:
+                high = middle
+            else:
+                return True
+        return False
+
+    def __contains__(self, password):
+        if isinstance(password, unicode):
+            password = password.encode('utf-8')
+        return self.contains_digest(hashlib.sha1(password).digest())
+
+    def close(self):
+        self._mmap.close()
+
+
+_corpora = {}
+_corpora_lock = threading.Lock()
+
+def get_breached_passwords():
+    """
+    Returns the corpus of BREACHED_PASSWORDS_FILE, or None if the setting is empty.
+    The file is opened once per process (before fork, if the app is preloaded).
+    """
+    path = settings.BREACHED_PASSWORDS_FILE
+    if not path:
+        return None
+    corpus = _corpora.get(path)
+    if corpus is None:
+        with _corpora_lock:
+            corpus = _corpora.get(path)
+            if corpus is None:
+                corpus = _corpora[path] = BreachedPasswords(path)
+    return corpus
+
+def validate_not_breached(password):
+    """
+    Validator which rejects passwords found in the breached passwords corpus.
+    """
+    corpus = get_breached_passwords()
+    if corpus is not None and password in corpus:
+        raise ValidationError("This password is known from data breaches. Please use another password.")
@@ -0,0 +1,97 @@
+"""
+Two-tier cache: in-process LRU with TTL (L1) in front of the shared Django cache (L2).
+
+Keys are spread over slots of node-wide generation counters (see service.shared).
+Invalidation bumps the generation of the key's slot, which drops the L1 entry in every
+worker process of the node, and deletes the L2 entry.
+"""
+import copy
+import threading
+import time
+import zlib
+from collections import OrderedDict
+from django.conf import settings
+from django.core.cache import cache
+from service.shared import SharedCounters
+
+class TwoTierCache(object):
+    """
+    Cache of objects loaded by key, e.g. users by id. Values returned by get() are shallow copies,
+    so callers may set attributes on them without affecting the cached value.
+    """
+    def __init__(self, name, maxsize, ttl, slots=4096):
+        self.name, self.maxsize, self.ttl = name, maxsize, ttl
+        self.generations = SharedCounters('cache_%s' % name, slots)
+        self._slots = slots
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = self.l2_hits = self.misses = self.evictions = 0
+
+    def _slot(self, key):
+        return zlib.crc32(str(key)) % self._slots
+
+    def _l2_key(self, key):
+        return 'txtr:%s:%s' % (self.name, key)
+
+    def get(self, key, loader):
+        """
+        Returns the cached value of the key, loading it with loader(key) on a miss.
+        None returned by the loader is not cached.
+        """
+        generation = self.generations.get(self._slot(key))
+        with self._lock:
+            entry = self._entries.pop(key, None)
+            if entry is not None and entry[0] > time.time() and entry[1] == generation:
+                self._entries[key] = entry
+                self.hits += 1
+                return copy.copy(entry[2])
+        value = cache.get(self._l2_key(key))
+        if value is not None:
+            self.l2_hits += 1
+        else:
+            self.misses += 1
+            value = loader(key)
+            if value is None:
+                return None
+            # Do not put a value loaded before a concurrent invalidation into L2.
+            if self.generations.get(self._slot(key)) == generation:
+                cache.set(self._l2_key(key), value, self.ttl)
+        self._set_l1(key, generation, value)
+        return copy.copy(value)
+
+    def _set_l1(self, key, generation, value):
+        with self._lock:
+            self._entries[key] = (time.time() + self.ttl, generation, value)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, key):
+        """
+        Drops the key from L1 of all processes of the node and from L2.
+        """
+        self.generations.increment(self._slot(key))
+        with self._lock:
+            self._entries.pop(key, None)
+        cache.delete(self._l2_key(key))
+
+    def clear(self):
+        """
+        Drops all L1 entries of this process.
+        """
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        requests = self.hits + self.l2_hits + self.misses
+        return {
+            'size': len(self._entries),
+            'maxsize': self.maxsize,
+            'hits': self.hits,
+            'l2_hits': self.l2_hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'hit_rate': float(self.hits + self.l2_hits) / requests if requests else 0.0,
+        }
+
+user_cache = TwoTierCache('users', settings.USER_CACHE_SIZE, settings.USER_CACHE_TTL)
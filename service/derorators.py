@@ -1,4 +1,9 @@
-from django.http import HttpResponseRedirect
+import hashlib
+import os
+from functools import wraps
+from django.conf import settings
+from django.http import HttpResponseRedirect, HttpResponseNotModified
+from django.template.loaders.app_directories import app_template_dirs
 
 def anonymous_required(redirect_url=None):
     """
@@ -12,4 +17,45 @@ def anonymous_required(redirect_url=None):
                 result = HttpResponseRedirect(redirect_url if redirect_url else '/')
             return result
         return wrapper
-    return decorator
\ No newline at end of file
+    return decorator
+
+def weak_etag(version_func):
+    """
+    Decorator for views that supports conditional GET. version_func(request, *args, **kwargs)
+    returns a string that changes whenever the page changes, or None to skip the check.
+    The page is not rendered if the client has it. ETags are weak, so they stay valid
+    when the page is compressed.
+    """
+    def decorator(func):
+        @wraps(func)
+        def wrapper(request, *args, **kwargs):
+            version = version_func(request, *args, **kwargs) if request.method in ('GET', 'HEAD') else None
+            if version is None:
+                return func(request, *args, **kwargs)
+            etag = 'W/"%s"' % hashlib.md5(version.encode('utf-8')).hexdigest()
+            if_none_match = request.META.get('HTTP_IF_NONE_MATCH', '')
+            if if_none_match.strip() == '*' or etag[2:] in [tag.strip().replace('W/', '', 1) for tag in if_none_match.split(',')]:
+                response = HttpResponseNotModified()
+            else:
+                response = func(request, *args, **kwargs)
+                if response.status_code != 200:
+                    return response
+            response['ETag'] = etag
+            return response
+        return wrapper
+    return decorator
+
+_template_versions = {}
+
+def template_version(*names):
+    """
+    Version of the templates, their modification times. Cached unless DEBUG,
+    like the templates themselves.
+    """
+    if names not in _template_versions or settings.DEBUG:
+        mtimes = []
+        for name in names:
+            paths = [os.path.join(directory, name) for directory in tuple(settings.TEMPLATE_DIRS) + app_template_dirs]
+            mtimes.append('%d' % max([os.path.getmtime(path) for path in paths if os.path.exists(path)] or [0]))
+        _template_versions[names] = '-'.join(mtimes)
+    return _template_versions[names]
@@ -0,0 +1,208 @@
+"""
+Append-only log of user lifecycle events for downstream consumers.
+
+The log is a directory of segment files. Every event is one line of JSON, its offset is
+the position of the line in the whole log, so a segment file is named by the offset of
+its first event. Writers of all processes append under a lock on the log directory and
+fsync in batches: after EVENT_LOG_FSYNC_EVENTS events or EVENT_LOG_FSYNC_INTERVAL seconds.
+Consumers read from a known offset and never scan the database.
+"""
+import atexit
+import fcntl
+import json
+import os
+import threading
+import time
+from django.conf import settings
+from django.utils import timezone
+
+REGISTERED = 'registered'
+VERIFIED = 'verified'
+SUBSCRIBED = 'subscribed'
+UNSUBSCRIBED = 'unsubscribed'
+
+SEGMENT_SUFFIX = '.log'
+
+def segment_name(base):
+    return '%020d%s' % (base, SEGMENT_SUFFIX)
+
+class InvalidOffset(ValueError):
+    """
+    The offset is not at the start of an event.
+    """
+
+class EventLog(object):
+    """
+    Segmented event log in EVENT_LOG_DIR, None disables the log.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._opened = None
+        self._lock_file = None
+        self._segment = None
+        self._fd = None
+        self._unsynced = 0
+        self._synced_at = 0
+
+    @property
+    def directory(self):
+        return settings.EVENT_LOG_DIR
+
+    def segments(self):
+        """
+        Sorted base offsets of the segments.
+        """
+        try:
+            names = os.listdir(self.directory)
+        except OSError:
+            return []
+        return sorted(int(name[:-len(SEGMENT_SUFFIX)]) for name in names
+                      if name.endswith(SEGMENT_SUFFIX) and name[:-len(SEGMENT_SUFFIX)].isdigit())
+
+    def append(self, event_type, user_ids, **data):
+        """
+        Appends one event per user id with a single write. Returns offset of the end of the log.
+        """
+        if not self.directory or not user_ids:
+            return None
+        created = timezone.now().isoformat()
+        lines = []
+        for user_id in user_ids:
+            event = dict(data, type=event_type, user_id=user_id, created=created)
+            lines.append(json.dumps(event, sort_keys=True) + '\n')
+        payload = ''.join(lines)
+        with self._lock:
+            self._open()
+            fcntl.lockf(self._lock_file, fcntl.LOCK_EX)
+            try:
+                base, size = self._current_segment()
+                os.write(self._fd, payload)
+                self._unsynced += len(lines)
+                if (self._unsynced >= settings.EVENT_LOG_FSYNC_EVENTS or
+                        time.time() - self._synced_at >= settings.EVENT_LOG_FSYNC_INTERVAL):
+                    self._sync()
+            finally:
+                fcntl.lockf(self._lock_file, fcntl.LOCK_UN)
+        return base + size + len(payload)
+
+    def flush(self):
+        """
+        Writes unsynced events to the disk.
+        """
+        with self._lock:
+            if self._opened == (os.getpid(), self.directory) and self._unsynced:
+                self._sync()
+
+    def read(self, offset, limit=100):
+        """
+        Reads at most 'limit' events starting at the offset. Returns tuple (events, next offset),
+        every event has its 'offset'. An offset of a pruned segment starts at the oldest event.
+        Raises InvalidOffset if the offset is inside an event or after the end of the log.
+        """
+        segments = self.segments()
+        events = []
+        for i, base in enumerate(segments):
+            end = segments[i + 1] if i + 1 < len(segments) else None
+            if end is not None and end <= offset:
+                continue
+            offset = max(offset, base)
+            with open(os.path.join(self.directory, segment_name(base)), 'rb') as segment:
+                if offset > base:
+                    # Every event ends with a newline, so an event starts after one.
+                    segment.seek(offset - base - 1)
+                    if segment.read(1) != '\n':
+                        raise InvalidOffset('Offset %d is not at the start of an event' % offset)
+                else:
+                    segment.seek(offset - base)
+                for line in segment:
+                    # A line without the newline is still being written.
+                    if len(events) >= limit or not line.endswith('\n'):
+                        return events, offset
+                    event = json.loads(line)
+                    event['offset'] = offset
+                    events.append(event)
+                    offset += len(line)
+            if end is not None:
+                offset = end
+        return events, offset
+
+    def prune(self, before, limit=None):
+        """
+        Deletes at most 'limit' segments last written before the timestamp, the current segment is kept.
+        Returns number of deleted segments.
+        """
+        deleted = 0
+        for base in self.segments()[:-1][:limit]:
+            path = os.path.join(self.directory, segment_name(base))
+            if os.path.getmtime(path) >= before:
+                break
+            os.remove(path)
+            deleted += 1
+        return deleted
+
+    def _open(self):
+        # Descriptors are reopened in a forked worker, so locks and fsync batches are per process.
+        if self._opened == (os.getpid(), self.directory):
+            return
+        if self._fd is not None and self._opened[0] == os.getpid():
+            self._sync()
+            os.close(self._fd)
+            self._lock_file.close()
+        if not os.path.isdir(self.directory):
+            try:
+                os.makedirs(self.directory)
+            except OSError:
+                if not os.path.isdir(self.directory):
+                    raise
+        self._lock_file = open(os.path.join(self.directory, 'lock'), 'a+b')
+        self._segment, self._fd, self._unsynced = None, None, 0
+        self._synced_at = time.time()
+        self._opened = (os.getpid(), self.directory)
+
+    def _current_segment(self):
+        """
+        Returns base and size of the segment to append to, rolls over a full segment.
+        Must be called with the log locked.
+        """
+        if self._fd is not None:
+            size = os.fstat(self._fd).st_size
+            if size < settings.EVENT_LOG_SEGMENT_SIZE:
+                return self._segment, size
+        # The segment is full or not opened yet, another process could have rolled over already.
+        segments = self.segments()
+        base = segments[-1] if segments else 0
+        size = self._segment_size(base) if segments else 0
+        if size >= settings.EVENT_LOG_SEGMENT_SIZE:
+            base, size = base + size, 0
+        if base != self._segment:
+            if self._fd is not None:
+                if self._unsynced:
+                    self._sync()
+                os.close(self._fd)
+            path = os.path.join(self.directory, segment_name(base))
+            self._fd = os.open(path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+            self._segment = base
+        return base, size
+
+    def _segment_size(self, base):
+        return os.path.getsize(os.path.join(self.directory, segment_name(base)))
+
+    def _sync(self):
+        os.fsync(self._fd)
+        self._unsynced = 0
+        self._synced_at = time.time()
+
+
+event_log = EventLog()
+atexit.register(event_log.flush)
+
+def wait_for_events(offset, limit=100, timeout=0, interval=0.2):
+    """
+    Reads events from the offset, waits up to 'timeout' seconds for new ones if there are none.
+    """
+    deadline = time.time() + timeout
+    while True:
+        events, next_offset = event_log.read(offset, limit)
+        if events or time.time() >= deadline:
+            return events, next_offset
+        time.sleep(interval)
@@ -1,6 +1,8 @@
 from django import forms
 from django.contrib.auth.forms import AuthenticationForm, PasswordChangeForm as PasswordChangeFormDjango
 from django.contrib.auth.models import User
+from service.bloom import email_filter
+from service.breached import validate_not_breached
 from service.models import UserProfile
 from django.contrib.auth import authenticate
 
@@ -24,7 +26,7 @@ class RegistrationForm(forms.Form):
     first_name = forms.CharField(label="First Name", max_length=30, required=True)
     last_name = forms.CharField(label="Last Name", max_length=30, required=True)
     password1 = forms.RegexField(label="Password", min_length=5, widget=forms.PasswordInput(render_value=True),\
-        required=True, regex='^.*\d.*$')
+        required=True, regex='^.*\d.*$', validators=[validate_not_breached])
     password2 = forms.RegexField(label="Password (again)", widget=forms.PasswordInput(render_value=True),\
         required=True, regex='^.*\d.*$')
 
@@ -37,9 +39,10 @@ class RegistrationForm(forms.Form):
         """
         Validate the  email.
         """
-        if User.objects.filter(email=self.cleaned_data['email'].lower()):
+        email = UserProfile.objects.normalize_email(self.cleaned_data['email'])
+        if email_filter.might_exist(email) and User.objects.filter(email__in=set([email, self.cleaned_data['email']])).exists():
             raise forms.ValidationError("This email address is already exist. Please use another email.")
-        return self.cleaned_data['email']
+        return email
 
     def clean(self):
         """
@@ -69,7 +72,7 @@ class PasswordChangeForm(PasswordChangeFormDjango):
     Changes User password
     """
     new_password1 = forms.RegexField(label="New password", min_length=5, widget=forms.PasswordInput(render_value=True),\
-        required=True, regex='^.*\d.*$')
+        required=True, regex='^.*\d.*$', validators=[validate_not_breached])
     new_password2 = forms.RegexField(label="New password confirmation", min_length=5,\
         widget=forms.PasswordInput(render_value=True), required=True, regex='^.*\d.*$')
 
@@ -86,7 +89,8 @@ class SubscribeForm(forms.Form):
             self.initial['subscribe'] = user.profile.subscribed
 
     def save(self, commit=True):
-        self.user.profile.subscribed = self.cleaned_data['subscribe']
         if commit:
-            self.user.profile.save()
+            self.user.profile.update_subscribed(self.cleaned_data['subscribe'])
+        else:
+            self.user.profile.subscribed = self.cleaned_data['subscribe']
         return self.user
\ No newline at end of file
@@ -0,0 +1,130 @@
+"""
+Rendering and delivery of the service emails.
+
+Every email consists of a plain text template and an html template with the same name,
+e.g. 'service/mail/verification_email' is rendered from 'service/mail/verification_email.txt'
+and 'service/mail/verification_email.html'. Templates are compiled once per process.
+
+Emails are handed off to a background thread when EMAIL_ASYNC is on, so a request
+never waits for SMTP. Under uWSGI this requires the enable-threads option, without it
+emails are sent synchronously.
+"""
+import atexit
+import logging
+import os
+import threading
+import Queue
+from django.conf import settings
+from django.core.mail import EmailMultiAlternatives, get_connection
+from django.template import Context
+from django.template.loader import get_template
+from service.shared import threads_enabled
+
+logger = logging.getLogger(__name__)
+
+_compiled_templates = {}
+
+def get_compiled_template(template_name):
+    """
+    Returns compiled template. Template is loaded and compiled only on the first call.
+    """
+    try:
+        return _compiled_templates[template_name]
+    except KeyError:
+        template = _compiled_templates[template_name] = get_template(template_name)
+        return template
+
+def clear_compiled_templates():
+    """
+    Drops all compiled templates, e.g. after templates were changed.
+    """
+    _compiled_templates.clear()
+
+def render_mail(template_name, context):
+    """
+    Renders plain text and html parts of the email. Returns tuple (text, html).
+    """
+    text = get_compiled_template(template_name + '.txt').render(Context(context, autoescape=False))
+    html = get_compiled_template(template_name + '.html').render(Context(context))
+    return text, html
+
+def build_mail(template_name, context, subject, to, from_email=None):
+    """
+    Builds email message with plain text and html alternative.
+    """
+    text, html = render_mail(template_name, context)
+    msg = EmailMultiAlternatives(subject, text, from_email or settings.EMAIL_FROM_DEFAULT, to)
+    msg.attach_alternative(html, "text/html")
+    return msg
+
+
+class MailDispatcher(object):
+    """
+    Sends queued emails from a background thread. Queued emails are sent in batches
+    of EMAIL_BATCH_SIZE through one connection to the mail server.
+    """
+    def __init__(self):
+        self.queue = Queue.Queue()
+        self._lock = threading.Lock()
+        self._pid = None
+        self._threads = None
+
+    def send(self, message):
+        """
+        Queues the message. Sends it immediately if EMAIL_ASYNC is off or threads can't run.
+        """
+        if not settings.EMAIL_ASYNC or not self._threads_enabled():
+            message.send()
+            return
+        self._ensure_worker()
+        self.queue.put(message)
+
+    def flush(self):
+        """
+        Blocks until all queued emails are sent.
+        """
+        if self._pid == os.getpid():
+            self.queue.join()
+
+    def _threads_enabled(self):
+        if self._threads is None:
+            self._threads = threads_enabled()
+            if not self._threads:
+                logger.warning('EMAIL_ASYNC is on, but uWSGI runs without enable-threads, emails are sent synchronously')
+        return self._threads
+
+    def _ensure_worker(self):
+        # Threads do not survive fork, so every worker process starts its own one.
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid != os.getpid():
+                thread = threading.Thread(target=self._run, name='mail-dispatcher')
+                thread.daemon = True
+                thread.start()
+                self._pid = os.getpid()
+
+    def _run(self):
+        while True:
+            messages = [self.queue.get()]
+            while len(messages) < settings.EMAIL_BATCH_SIZE:
+                try:
+                    messages.append(self.queue.get_nowait())
+                except Queue.Empty:
+                    break
+            try:
+                get_connection().send_messages(messages)
+            except Exception:
+                logger.exception('Failed to send %d emails', len(messages))
+            finally:
+                for message in messages:
+                    self.queue.task_done()
+
+dispatcher = MailDispatcher()
+atexit.register(dispatcher.flush)
+
+def queue_mail(message):
+    """
+    Sends the message without blocking the caller (see MailDispatcher).
+    """
+    dispatcher.send(message)
@@ -0,0 +1,248 @@
+"""
+Housekeeping jobs run by 'manage.py maintenance'.
+
+Every job works in small batches. Each batch is one short write transaction and the
+scheduler pauses between batches, so the database write lock is never held for long and
+requests are not blocked. Batch size adapts to keep the lock time of a batch near
+MAINTENANCE_LOCK_TARGET seconds.
+"""
+import logging
+import time
+from datetime import timedelta
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.contrib.sessions.models import Session
+from django.db import connection, transaction
+from django.utils import timezone
+from service.bloom import email_filter
+from service.events import event_log
+from service.models import UserProfile, LoginActivity
+
+logger = logging.getLogger(__name__)
+
+class JobReport(object):
+    """
+    Rows processed and lock time of one run of a job. Lock time of a batch is measured as the
+    time of the whole batch, so it's an upper bound.
+    """
+    def __init__(self, name):
+        self.name = name
+        self.rows = self.batches = 0
+        self.lock_time = self.max_lock_time = 0.0
+
+    def add_batch(self, rows, lock_time):
+        self.rows += rows
+        self.batches += 1
+        self.lock_time += lock_time
+        self.max_lock_time = max(self.max_lock_time, lock_time)
+
+    def __unicode__(self):
+        return u'%s: %d rows in %d batches, lock time %.1f ms (max %.1f ms)' % (
+            self.name, self.rows, self.batches, self.lock_time * 1000, self.max_lock_time * 1000)
+
+
+class Job(object):
+    """
+    Housekeeping job. run_batch() processes at most batch_size rows in one transaction
+    and returns number of processed rows, 0 when there's nothing left to do.
+    Jobs which are not batched run once per interval.
+    """
+    name = None
+    batched = True
+
+    def is_enabled(self):
+        return True
+
+    def run_batch(self, batch_size):
+        raise NotImplementedError
+
+
+class DeleteJob(Job):
+    """
+    Deletes rows of get_queryset() by primary key in batches.
+    """
+    def get_queryset(self):
+        raise NotImplementedError
+
+    def run_batch(self, batch_size):
+        queryset = self.get_queryset()
+        pks = list(queryset.order_by().values_list('pk', flat=True)[:batch_size])
+        if pks:
+            with transaction.commit_on_success():
+                queryset.model.objects.filter(pk__in=pks).delete()
+        return len(pks)
+
+
+class ExpiredSessionsJob(DeleteJob):
+    name = 'sessions'
+
+    def get_queryset(self):
+        return Session.objects.filter(expire_date__lt=timezone.now())
+
+
+class UnverifiedUsersJob(DeleteJob):
+    """
+    Deletes users who did not verify the email within UNVERIFIED_USER_TTL_DAYS days.
+    """
+    name = 'unverified_users'
+
+    def is_enabled(self):
+        return settings.UNVERIFIED_USER_TTL_DAYS is not None
+
+    def run_batch(self, batch_size):
+        rows = super(UnverifiedUsersJob, self).run_batch(batch_size)
+        # The filter must be rebuilt after the commit, there is no request to finish.
+        email_filter.invalidate_pending()
+        return rows
+
+    def get_queryset(self):
+        deadline = timezone.now() - timedelta(days=settings.UNVERIFIED_USER_TTL_DAYS)
+        return User.objects.filter(date_joined__lt=deadline, is_staff=False)\
+            .exclude(profile__verification_key=UserProfile.VERIFIED)
+
+
+class LoginActivityJob(DeleteJob):
+    """
+    Deletes login activity older than LOGIN_ACTIVITY_RETENTION_DAYS days.
+    """
+    name = 'login_activity'
+
+    def get_queryset(self):
+        return LoginActivity.objects.filter(
+            created__lt=timezone.now() - timedelta(days=settings.LOGIN_ACTIVITY_RETENTION_DAYS))
+
+
+class ResendVerificationJob(Job):
+    """
+    Resends verification emails requested for big selections of the profiles admin
+    (see UserProfileManager.request_verification_resend).
+    """
+    name = 'resend_verification'
+
+    def run_batch(self, batch_size):
+        pks = list(UserProfile.objects.filter(verification_requested=True).order_by()
+                   .values_list('pk', flat=True)[:batch_size])
+        if pks:
+            UserProfile.objects.resend_verification(UserProfile.objects.filter(pk__in=pks))
+            with transaction.commit_on_success():
+                UserProfile.objects.filter(pk__in=pks).update(verification_requested=False)
+        return len(pks)
+
+
+class EventLogJob(Job):
+    """
+    Deletes event log segments older than EVENT_LOG_RETENTION_DAYS days, one segment per batch.
+    """
+    name = 'event_log'
+
+    def is_enabled(self):
+        return settings.EVENT_LOG_DIR is not None
+
+    def run_batch(self, batch_size):
+        return event_log.prune(time.time() - settings.EVENT_LOG_RETENTION_DAYS * 24 * 60 * 60, limit=1)
+
+
+class SqliteJob(Job):
+    def is_enabled(self):
+        return connection.vendor == 'sqlite'
+
+
+class AnalyzeJob(SqliteJob):
+    """
+    Updates query planner statistics. analysis_limit bounds the number of rows ANALYZE reads per index.
+    """
+    name = 'analyze'
+    batched = False
+
+    def run_batch(self, batch_size):
+        cursor = connection.cursor()
+        cursor.execute('PRAGMA analysis_limit = %d' % (batch_size * 10))
+        cursor.execute('ANALYZE')
+        return 1
+
+
+class IncrementalVacuumJob(SqliteJob):
+    """
+    Returns free pages to the file system. The database must be in incremental auto_vacuum mode
+    (PRAGMA auto_vacuum = INCREMENTAL followed by VACUUM, once).
+    """
+    name = 'incremental_vacuum'
+
+    def is_enabled(self):
+        if not super(IncrementalVacuumJob, self).is_enabled():
+            return False
+        cursor = connection.cursor()
+        cursor.execute('PRAGMA auto_vacuum')
+        return cursor.fetchone()[0] == 2
+
+    def run_batch(self, batch_size):
+        cursor = connection.cursor()
+        cursor.execute('PRAGMA freelist_count')
+        pages = min(cursor.fetchone()[0], batch_size)
+        if pages:
+            cursor.execute('PRAGMA incremental_vacuum(%d)' % pages)
+            cursor.fetchall()
+        return pages
+
+
+class Scheduler(object):
+    """
+    Runs the jobs on their MAINTENANCE_INTERVALS.
+    """
+    def __init__(self, jobs):
+        self.jobs = jobs
+        self.batch_sizes = dict((job.name, settings.MAINTENANCE_BATCH_SIZE) for job in jobs)
+        self.next_runs = dict((job.name, 0) for job in jobs)
+
+    def run_job(self, job):
+        """
+        Runs the job in batches until it's done or MAINTENANCE_JOB_TIME is over. Returns JobReport.
+        """
+        report = JobReport(job.name)
+        started = time.time()
+        while time.time() - started < settings.MAINTENANCE_JOB_TIME:
+            batch_size = self.batch_sizes[job.name]
+            batch_started = time.time()
+            rows = job.run_batch(batch_size)
+            lock_time = time.time() - batch_started
+            if not rows:
+                break
+            report.add_batch(rows, lock_time)
+            if not job.batched:
+                break
+            self._adapt_batch_size(job, rows, lock_time)
+            time.sleep(settings.MAINTENANCE_BATCH_PAUSE)
+        return report
+
+    def _adapt_batch_size(self, job, rows, lock_time):
+        batch_size = self.batch_sizes[job.name]
+        if lock_time > settings.MAINTENANCE_LOCK_TARGET:
+            batch_size = max(1, batch_size // 2)
+        elif rows == batch_size and lock_time < settings.MAINTENANCE_LOCK_TARGET / 2:
+            batch_size = min(settings.MAINTENANCE_BATCH_SIZE, batch_size * 2)
+        self.batch_sizes[job.name] = batch_size
+
+    def run_pending(self):
+        """
+        Runs jobs whose interval has passed. Returns list of JobReport. A disabled job
+        is checked again after its interval as well.
+        """
+        reports = []
+        for job in self.jobs:
+            if time.time() < self.next_runs[job.name]:
+                continue
+            try:
+                if job.is_enabled():
+                    reports.append(self.run_job(job))
+            except Exception:
+                logger.exception('Maintenance job %s failed', job.name)
+            self.next_runs[job.name] = time.time() + settings.MAINTENANCE_INTERVALS[job.name]
+        return reports
+
+    def seconds_to_next_run(self):
+        return max(0, min(self.next_runs.values()) - time.time())
+
+
+def get_jobs():
+    return [ExpiredSessionsJob(), UnverifiedUsersJob(), LoginActivityJob(), ResendVerificationJob(),
+            EventLogJob(), AnalyzeJob(), IncrementalVacuumJob()]
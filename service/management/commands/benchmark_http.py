@@ -0,0 +1,49 @@
+import os
+import time
+from optparse import make_option
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.core.urlresolvers import reverse
+from django.test.client import Client
+from service.models import UserProfile
+
+class Command(BaseCommand):
+    """
+    Measures bytes on the wire and server time of repeat visits of the pages of a logged in user:
+    a client without compression and validators against a client that accepts gzip and sends
+    the ETag of its cached copy. A temporary user is created and deleted afterwards.
+    """
+    help = 'Benchmarks repeat visits of the service pages'
+    option_list = BaseCommand.option_list + (
+        make_option('--count', type='int', dest='count', default=1000,
+            help='Number of requests of every page (default 1000).'),
+    )
+
+    def handle(self, *args, **options):
+        email, password = 'benchmark-%s@txtr.invalid' % os.urandom(8).encode('hex'), os.urandom(8).encode('hex')
+        user = User.objects.create_user(email[:30], email, password)
+        UserProfile.objects.create(user=user)
+        try:
+            client = Client()
+            client.login(username=email, password=password)
+            for name in ('home', 'settings'):
+                plain_bytes, plain_time = self._measure(client, name, options['count'], False)
+                bytes, seconds = self._measure(client, name, options['count'], True)
+                self.stdout.write('%s: %d -> %d bytes per visit, %.2f -> %.2f ms per visit\n' % (
+                    name, plain_bytes, bytes, plain_time * 1000, seconds * 1000))
+        finally:
+            user.delete()
+
+    def _measure(self, client, name, count, optimized):
+        """
+        Returns average bytes (headers and body) and seconds of a repeat visit.
+        """
+        headers = {'HTTP_ACCEPT_ENCODING': 'gzip'} if optimized else {}
+        response = client.get(reverse(name), **headers)
+        if optimized and response.has_header('ETag'):
+            headers['HTTP_IF_NONE_MATCH'] = response['ETag']
+        total_bytes = 0
+        started = time.time()
+        for i in xrange(count):
+            total_bytes += len(str(client.get(reverse(name), **headers)))
+        return total_bytes / count, (time.time() - started) / count
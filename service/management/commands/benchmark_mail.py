@@ -0,0 +1,52 @@
+import time
+from optparse import make_option
+from django.core.management.base import BaseCommand
+from django.contrib.auth.models import User
+from django.template.loader import render_to_string
+from django.utils.html import strip_tags
+from service.mail import render_mail
+from service.models import UserProfile
+
+class Command(BaseCommand):
+    """
+    Compares verification email rendering rate of the compiled mail templates with
+    render_to_string() + strip_tags(). Only the text and html parts are rendered,
+    MIME messages are neither built nor sent.
+    """
+    help = 'Benchmarks rendering of the verification email'
+    option_list = BaseCommand.option_list + (
+        make_option('--count', type='int', dest='count', default=100000,
+            help='Number of emails to render (default 100000).'),
+        make_option('--legacy-count', type='int', dest='legacy_count', default=None,
+            help='Number of emails to render with render_to_string() + strip_tags() (default --count).'),
+    )
+
+    def handle(self, *args, **options):
+        count = options['count']
+        legacy_count = options['legacy_count'] or count
+        profiles = [self._make_profile(i) for i in range(100)]
+
+        legacy_rate = self._measure(legacy_count, profiles, self._render_legacy)
+        self.stdout.write('render_to_string + strip_tags: %d emails, %.0f emails/s\n' % (legacy_count, legacy_rate))
+        rate = self._measure(count, profiles, self._render)
+        self.stdout.write('compiled templates: %d emails, %.0f emails/s\n' % (count, rate))
+        self.stdout.write('speedup: %.1fx\n' % (rate / legacy_rate))
+
+    def _make_profile(self, i):
+        user = User(pk=i, email='user%d@txtr.com' % i, first_name='First%d' % i, last_name='Last%d' % i)
+        profile = UserProfile(user=user, verification_key='%040x' % i)
+        user._profile_cache = profile
+        return profile
+
+    def _measure(self, count, profiles, render):
+        started = time.time()
+        for i in xrange(count):
+            render(profiles[i % len(profiles)])
+        return count / max(time.time() - started, 1e-9)
+
+    def _render(self, profile):
+        return render_mail('service/mail/verification_email', profile.get_verification_context())
+
+    def _render_legacy(self, profile):
+        html_content = render_to_string('service/mail/verification_email.html', profile.get_verification_context())
+        return strip_tags(html_content), html_content
@@ -0,0 +1,71 @@
+import json
+import os
+import subprocess
+import sys
+from optparse import make_option
+from django.core.management.base import BaseCommand
+
+class Command(BaseCommand):
+    """
+    Compares worker startup with and without preloading (see txtr.warmup). Every run imports
+    the WSGI application in a fresh master process and forks workers like uWSGI does. Every
+    worker serves one request and reports time to the first response, RSS and private
+    (not shared with the master) memory.
+    """
+    help = 'Reports time-to-first-request and per-worker memory with and without preloading'
+    requires_model_validation = False
+    option_list = BaseCommand.option_list + (
+        make_option('--workers', type='int', dest='workers', default=4,
+            help='Number of forked workers (default 4).'),
+        make_option('--path', dest='path', default='/login/',
+            help='Path of the first request (default /login/).'),
+    )
+
+    def handle(self, *args, **options):
+        for preload in (False, True):
+            code = 'from service.management.commands.benchmark_startup import run_master; run_master(%r, %d, %r)' % (
+                preload, options['workers'], options['path'])
+            output = subprocess.check_output([sys.executable, '-c', code], env=os.environ.copy())
+            results = [json.loads(line) for line in output.splitlines() if line.startswith('{')]
+            count = len(results)
+            self.stdout.write('%s: first request %.1f ms, RSS %.1f MB, private %.1f MB (average of %d workers)\n' % (
+                'preloaded' if preload else 'lazy',
+                sum(result['first_request'] for result in results) / count * 1000,
+                sum(result['rss'] for result in results) / count / 1024.0,
+                sum(result['private'] for result in results) / count / 1024.0,
+                count))
+
+def run_master(preload, workers, path):
+    import time
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'txtr.settings')
+    from django.conf import settings
+    settings.PRELOAD_APPLICATION = preload
+    from txtr.wsgi import application
+
+    for i in range(workers):
+        pid = os.fork()
+        if pid == 0:
+            from wsgiref.util import setup_testing_defaults
+            environ = {'PATH_INFO': path, 'REQUEST_METHOD': 'GET'}
+            setup_testing_defaults(environ)
+            started = time.time()
+            ''.join(application(environ, lambda status, headers, exc_info=None: None))
+            first_request = time.time() - started
+            rss, private = _memory_usage()
+            sys.stdout.write(json.dumps({'first_request': first_request, 'rss': rss, 'private': private}) + '\n')
+            sys.stdout.flush()
+            os._exit(0)
+        os.waitpid(pid, 0)
+
+def _memory_usage():
+    """
+    Returns RSS and private memory of the process in KB, read from /proc/self/smaps.
+    """
+    rss = private = 0
+    with open('/proc/self/smaps') as smaps:
+        for line in smaps:
+            if line.startswith('Rss:'):
+                rss += int(line.split()[1])
+            elif line.startswith('Private_Clean:') or line.startswith('Private_Dirty:'):
+                private += int(line.split()[1])
+    return rss, private
@@ -0,0 +1,78 @@
+import hashlib
+import os
+import shutil
+import struct
+import tempfile
+from optparse import make_option
+from django.core.management.base import BaseCommand, CommandError
+from service.breached import MAGIC, BUCKETS, INDEX_FORMAT, HEADER_SIZE, DIGEST_SIZE
+
+class Command(BaseCommand):
+    """
+    Converts a text dump of breached passwords into the binary corpus used by
+    service.breached. The dump is split by the first digest byte into 256 temporary
+    files, and every part is sorted separately, so memory usage is about 1/256 of the dump.
+    """
+    args = '<dump> <output>'
+    help = 'Builds breached passwords corpus. Dump lines are SHA1 hex digests, optionally followed by ":count".'
+    option_list = BaseCommand.option_list + (
+        make_option('--plain', action='store_true', dest='plain', default=False,
+            help='Dump lines are plain text passwords, not SHA1 digests.'),
+    )
+
+    def handle(self, *args, **options):
+        if len(args) != 2:
+            raise CommandError('Usage: manage.py build_breached_passwords %s' % self.args)
+        dump_path, output_path = args
+        temp_dir = tempfile.mkdtemp(prefix='breached-')
+        try:
+            skipped = self._split(dump_path, temp_dir, options['plain'])
+            count = self._write(temp_dir, output_path)
+        finally:
+            shutil.rmtree(temp_dir)
+        self.stdout.write('%d digests written to %s, %d invalid lines skipped\n' % (count, output_path, skipped))
+
+    def _split(self, dump_path, temp_dir, plain):
+        parts = [open(os.path.join(temp_dir, '%02x' % i), 'wb') for i in range(256)]
+        skipped = 0
+        try:
+            with open(dump_path, 'rb') as dump:
+                for line in dump:
+                    line = line.rstrip('\r\n')
+                    if plain:
+                        digest = hashlib.sha1(line).digest()
+                    else:
+                        try:
+                            digest = line.split(':', 1)[0].strip().decode('hex')
+                        except TypeError:
+                            digest = None
+                        if not digest or len(digest) != DIGEST_SIZE:
+                            skipped += 1
+                            continue
+                    parts[ord(digest[0])].write(digest)
+        finally:
+            for part in parts:
+                part.close()
+        return skipped
+
+    def _write(self, temp_dir, output_path):
+        # The corpus is replaced by rename, truncating a file mapped by running workers would crash them.
+        counts = [0] * BUCKETS
+        with open(output_path + '.tmp', 'wb') as output:
+            output.seek(HEADER_SIZE)
+            for i in range(256):
+                with open(os.path.join(temp_dir, '%02x' % i), 'rb') as part:
+                    data = part.read()
+                digests = sorted(set(data[j:j + DIGEST_SIZE] for j in xrange(0, len(data), DIGEST_SIZE)))
+                for digest in digests:
+                    counts[struct.unpack('>H', digest[:2])[0]] += 1
+                output.write(''.join(digests))
+            index, total = [], 0
+            for count in counts:
+                index.append(total)
+                total += count
+            index.append(total)
+            output.seek(0)
+            output.write(MAGIC + struct.pack(INDEX_FORMAT, *index))
+        os.rename(output_path + '.tmp', output_path)
+        return total
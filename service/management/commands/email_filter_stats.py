@@ -0,0 +1,29 @@
+import os
+from optparse import make_option
+from django.core.management.base import BaseCommand
+from service.bloom import email_filter
+
+class Command(BaseCommand):
+    """
+    Builds the email filter and reports its memory footprint and false positive rate.
+    The measured rate is the share of random unknown emails the filter reports as existing.
+    """
+    help = 'Reports memory footprint and false positive rate of the email filter'
+    option_list = BaseCommand.option_list + (
+        make_option('--probes', type='int', dest='probes', default=100000,
+            help='Number of unknown emails used to measure false positive rate (default 100000).'),
+    )
+
+    def handle(self, *args, **options):
+        email_filter.build()
+        stats = email_filter.stats()
+        for key in ('emails', 'capacity', 'bits', 'hashes', 'memory_size'):
+            self.stdout.write('%s: %d\n' % (key, stats[key]))
+        self.stdout.write('estimated false positive rate: %.6f\n' % stats['false_positive_rate'])
+
+        probes = options['probes']
+        if probes:
+            prefix = os.urandom(8).encode('hex')
+            false_positives = sum(1 for i in xrange(probes)
+                                  if email_filter.might_exist('%s.%d@probe.invalid' % (prefix, i)))
+            self.stdout.write('measured false positive rate: %.6f\n' % (float(false_positives) / probes))
@@ -0,0 +1,34 @@
+import time
+from optparse import make_option
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from service.maintenance import Scheduler, get_jobs
+
+class Command(BaseCommand):
+    """
+    Long-running scheduler of the housekeeping jobs (see service.maintenance).
+    """
+    help = 'Runs housekeeping jobs: expired sessions, unverified users, old login activity, ANALYZE, VACUUM'
+    option_list = BaseCommand.option_list + (
+        make_option('--once', action='store_true', dest='once', default=False,
+            help='Run every job once and exit.'),
+        make_option('--job', action='append', dest='jobs', default=[],
+            help='Run only this job, may be given several times.'),
+    )
+
+    def handle(self, *args, **options):
+        jobs = get_jobs()
+        if options['jobs']:
+            unknown = set(options['jobs']) - set(job.name for job in jobs)
+            if unknown:
+                raise CommandError('Unknown jobs: %s' % ', '.join(sorted(unknown)))
+            jobs = [job for job in jobs if job.name in options['jobs']]
+        scheduler = Scheduler(jobs)
+        while True:
+            for report in scheduler.run_pending():
+                self.stdout.write('%s\n' % unicode(report))
+            if options['once']:
+                break
+            # Do not keep the connection (and a possible SQLite read lock) open while idle.
+            connection.close()
+            time.sleep(scheduler.seconds_to_next_run())
@@ -0,0 +1,39 @@
+import json
+import time
+from optparse import make_option
+from django.core.management.base import BaseCommand, CommandError
+from service.events import event_log, InvalidOffset
+
+class Command(BaseCommand):
+    """
+    Prints events of the event log as JSON lines, every event has its offset.
+    A consumer saves the offset after the last processed event and continues from it.
+    """
+    help = 'Prints user lifecycle events from the given offset'
+    option_list = BaseCommand.option_list + (
+        make_option('--offset', type='int', dest='offset', default=0,
+            help='Offset to read from (default 0, the oldest event).'),
+        make_option('--limit', type='int', dest='limit', default=None,
+            help='Max number of events to print.'),
+        make_option('--follow', action='store_true', dest='follow', default=False,
+            help='Wait for new events instead of exiting at the end of the log.'),
+        make_option('--interval', type='float', dest='interval', default=1.0,
+            help='Seconds between polls with --follow (default 1).'),
+    )
+
+    def handle(self, *args, **options):
+        offset, left = options['offset'], options['limit']
+        while left is None or left > 0:
+            try:
+                events, offset = event_log.read(offset, 1000 if left is None else min(left, 1000))
+            except InvalidOffset as e:
+                raise CommandError(str(e))
+            for event in events:
+                self.stdout.write('%s\n' % json.dumps(event, sort_keys=True))
+            if left is not None:
+                left -= len(events)
+            if not events:
+                if not options['follow']:
+                    break
+                self.stdout.flush()
+                time.sleep(options['interval'])
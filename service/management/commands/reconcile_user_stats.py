@@ -0,0 +1,31 @@
+from collections import defaultdict
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from service.models import UserProfile, UserStat
+
+class Command(BaseCommand):
+    """
+    Recounts the user statistics counters, e.g. after users were changed by raw SQL.
+    Users are streamed, so memory usage depends only on the number of registration days.
+    Registrations are only raised, they include users deleted since.
+    """
+    help = 'Recounts UserStat counters from the users and profiles tables'
+
+    def handle(self, *args, **options):
+        registrations = defaultdict(int)
+        for date_joined in User.objects.order_by().values_list('date_joined', flat=True).iterator():
+            registrations[UserStat.registrations_key(UserStat.date_of(date_joined))] += 1
+        values = {
+            UserStat.USERS: sum(registrations.values()),
+            UserStat.PROFILES: UserProfile.objects.count(),
+            UserStat.VERIFIED: UserProfile.objects.filter(verification_key=UserProfile.VERIFIED).count(),
+            UserStat.SUBSCRIBED: UserProfile.objects.filter(subscribed=True).count(),
+        }
+        current = dict(UserStat.objects.values_list('key', 'value'))
+        for key, value in registrations.items():
+            values[key] = max(value, current.get(key, 0))
+        changed = dict((key, value) for key, value in values.items() if current.get(key, 0) != value)
+        UserStat.objects.set_values(changed)
+        for key in sorted(changed):
+            self.stdout.write('%s: %d\n' % (key, changed[key]))
+        self.stdout.write('%d counters corrected\n' % len(changed))
@@ -0,0 +1,38 @@
+import sys
+from optparse import make_option
+from django.core.management.base import BaseCommand, CommandError
+from service.models import UserProfile
+
+class Command(BaseCommand):
+    """
+    Unsubscribes users listed in a suppression file (bounces, complaints, removal requests).
+    The file is streamed, so its size is not limited by memory.
+    """
+    args = '<file>'
+    help = 'Unsubscribes (or subscribes with --subscribe) users by emails, one email per line. Use "-" for stdin.'
+    option_list = BaseCommand.option_list + (
+        make_option('--subscribe', action='store_true', dest='subscribe', default=False,
+            help='Subscribe the users instead of unsubscribing them.'),
+    )
+
+    def handle(self, *args, **options):
+        if len(args) != 1:
+            raise CommandError('Usage: manage.py suppress_emails %s' % self.args)
+        try:
+            stream = sys.stdin if args[0] == '-' else open(args[0])
+        except IOError, e:
+            raise CommandError(e)
+        try:
+            processed, matched, updated = UserProfile.objects.set_subscribed_by_emails(self._read_emails(stream),
+                options['subscribe'])
+        finally:
+            if stream is not sys.stdin:
+                stream.close()
+        self.stdout.write('%d emails processed, %d did not match any user, %d profiles updated\n' % (
+            processed, processed - matched, updated))
+
+    def _read_emails(self, stream):
+        for line in stream:
+            email = line.strip()
+            if email and not email.startswith('#'):
+                yield email
@@ -0,0 +1,59 @@
+import re
+from django.conf import settings
+from django.contrib.sessions.middleware import SessionMiddleware as DjangoSessionMiddleware
+from django.utils.cache import patch_vary_headers
+from django.utils.text import compress_string
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+class SessionMiddleware(DjangoSessionMiddleware):
+    """
+    Saves the session only if its data have actually changed, so read-only requests do not
+    write to the database. The session engine must provide has_changed() (see service.sessions).
+    """
+    def process_response(self, request, response):
+        session = getattr(request, 'session', None)
+        if session is not None and session.modified and hasattr(session, 'has_changed') and not session.has_changed():
+            session.modified = False
+        return super(SessionMiddleware, self).process_response(request, response)
+
+
+class CompressionMiddleware(object):
+    """
+    Compresses text responses of at least COMPRESSION_MIN_SIZE bytes with brotli, if the brotli
+    package is installed and the client accepts it, otherwise with gzip. Must be the first middleware.
+    Responses which used the CSRF token are not compressed: with reflected input, e.g. ?next= of
+    the login page, the compressed size would leak the token (BREACH).
+    """
+    COMPRESSIBLE_TYPES = ('text/html', 'text/plain', 'text/css', 'application/json', 'application/javascript')
+    accepts_brotli = re.compile(r'\bbr\b')
+    accepts_gzip = re.compile(r'\bgzip\b')
+
+    def process_response(self, request, response):
+        if (response.status_code != 200 or response.has_header('Content-Encoding') or
+                request.META.get('CSRF_COOKIE_USED') or
+                response.get('Content-Type', '').split(';')[0] not in self.COMPRESSIBLE_TYPES or
+                len(response.content) < settings.COMPRESSION_MIN_SIZE):
+            return response
+        patch_vary_headers(response, ('Accept-Encoding',))
+
+        accept_encoding = request.META.get('HTTP_ACCEPT_ENCODING', '')
+        if brotli is not None and self.accepts_brotli.search(accept_encoding):
+            content, encoding = brotli.compress(response.content, quality=settings.COMPRESSION_BROTLI_QUALITY), 'br'
+        elif self.accepts_gzip.search(accept_encoding):
+            content, encoding = compress_string(response.content), 'gzip'
+        else:
+            return response
+        if len(content) >= len(response.content):
+            return response
+
+        response.content = content
+        response['Content-Encoding'] = encoding
+        response['Content-Length'] = str(len(content))
+        # A strong ETag identifies the exact bytes, the compressed content is only equivalent.
+        if response.has_header('ETag') and not response['ETag'].startswith('W/'):
+            response['ETag'] = 'W/' + response['ETag']
+        return response
@@ -1,11 +1,22 @@
-from django.db import models
+from django.db import models, transaction, IntegrityError
+from django.db.models import F, Q
+from django.db.models.signals import post_init, post_save, post_delete
 import hashlib
 import time
-from django.template.loader import render_to_string
-from django.utils.html import strip_tags
-from django.core.mail import send_mail, EmailMultiAlternatives
-from django.contrib.auth.models import User
+from datetime import timedelta
+from itertools import islice
+from django.core.urlresolvers import reverse
+from django.contrib.auth.models import User, update_last_login
+from django.contrib.auth.signals import user_logged_in
+from django.core.signals import request_finished
 from django.conf import settings
+from django.utils import timezone
+from service.activity import record_login
+from service.bloom import email_filter
+from service.cache import user_cache
+from service import events
+from service.events import event_log
+from service.mail import build_mail, queue_mail
 
 class UserProfileManager(models.Manager):
     """
@@ -15,11 +26,14 @@ class UserProfileManager(models.Manager):
         """
         Creates new user
         """
-        new_user = User.objects.create_user(self._create_fake_username(email), email, password)
-        new_user.first_name, new_user.last_name = first_name, last_name
-        new_user.save()
+        email = self.normalize_email(email)
+        with transaction.commit_on_success():
+            new_user = User.objects.create_user(self._create_fake_username(email), email, password)
+            new_user.first_name, new_user.last_name = first_name, last_name
+            new_user.save()
 
-        user_profile = self.create(user=new_user)
+            user_profile = self.create(user=new_user)
+        event_log.append(events.REGISTERED, [new_user.pk], email=email)
         user_profile.send_email()
         return new_user
 
@@ -31,6 +45,13 @@ class UserProfileManager(models.Manager):
         return super(UserProfileManager, self).create(**kwargs)
 
 
+    @staticmethod
+    def normalize_email(email):
+        """
+        Emails are stored and looked up in lower case, feeds and users often change the case.
+        """
+        return (email or '').strip().lower()
+
     def _create_fake_username(self, email):
         return hashlib.sha1(email).hexdigest()[:30]
 
@@ -42,16 +63,119 @@ class UserProfileManager(models.Manager):
 
     def verification(self, verification_key):
         """
-        Validates an verification key and sets profile as verified
+        Validates an verification key and sets profile as verified. The key is checked again
+        in the UPDATE, so a profile verified by concurrent requests is counted once.
         """
+        if verification_key == self.model.VERIFIED:
+            return False
         try:
             user_profile = self.get(verification_key=verification_key)
         except self.model.DoesNotExist:
             return False
-        user_profile.verification_key = self.model.VERIFIED
-        user_profile.save()
+        with transaction.commit_on_success():
+            updated = self.filter(pk=user_profile.pk, verification_key=verification_key).update(
+                verification_key=self.model.VERIFIED)
+            UserStat.objects.increment(UserStat.VERIFIED, updated)
+        if not updated:
+            return False
+        user_cache.invalidate(user_profile.user_id)
+        event_log.append(events.VERIFIED, [user_profile.user_id])
         return user_profile.user
 
+    def set_subscribed(self, user_ids, subscribed):
+        """
+        Subscribes or unsubscribes users by ids. Only the 'subscribed' column of changed rows is updated,
+        in chunks of BULK_UPDATE_CHUNK_SIZE ids (SQLite limits the number of query parameters).
+        Returns number of updated profiles.
+        """
+        updated, chunk_size = 0, settings.BULK_UPDATE_CHUNK_SIZE
+        with transaction.commit_on_success():
+            for start in xrange(0, len(user_ids), chunk_size):
+                updated += self.update_subscribed(self.filter(user__in=user_ids[start:start + chunk_size]), subscribed)
+        return updated
+
+    def update_subscribed(self, queryset, subscribed):
+        """
+        Subscribes or unsubscribes profiles of the queryset. Only the 'subscribed' column of changed rows
+        is updated, in chunks of BULK_UPDATE_CHUNK_SIZE profiles, and an event is logged for every user.
+        Returns number of updated profiles.
+        """
+        updated, queryset = 0, queryset.filter(subscribed=not subscribed).order_by()
+        while True:
+            # Updated rows leave the queryset, so every chunk is selected from the start.
+            rows = list(queryset.values_list('pk', 'user_id')[:settings.BULK_UPDATE_CHUNK_SIZE])
+            if not rows:
+                break
+            with transaction.commit_on_success():
+                count = self.filter(pk__in=[pk for pk, user_id in rows], subscribed=not subscribed)\
+                    .update(subscribed=subscribed)
+                UserStat.objects.increment(UserStat.SUBSCRIBED, count if subscribed else -count)
+            event_log.append(events.SUBSCRIBED if subscribed else events.UNSUBSCRIBED, [user_id for pk, user_id in rows])
+            updated += count
+        return updated
+
+    def resend_verification(self, queryset):
+        """
+        Queues verification emails for unverified profiles of the queryset. The existing key is sent again,
+        repeated requests for a profile within VERIFICATION_RESEND_WINDOW seconds turn into one email.
+        Profiles are claimed in chunks of BULK_UPDATE_CHUNK_SIZE by one conditional UPDATE, which is atomic
+        in the database, so only the first request of the window in any worker process queues the email.
+        Emails are sent in batches by the mail dispatcher. Returns number of queued emails.
+        """
+        count, now = 0, timezone.now()
+        due = ~Q(verification_key=self.model.VERIFIED) & (Q(verification_sent__isnull=True) |
+            Q(verification_sent__lte=now - timedelta(seconds=settings.VERIFICATION_RESEND_WINDOW)))
+        queryset = queryset.filter(due).order_by()
+        while True:
+            # Claimed rows leave the queryset, so every chunk is selected from the start.
+            pks = list(queryset.values_list('pk', flat=True)[:settings.BULK_UPDATE_CHUNK_SIZE])
+            if not pks:
+                break
+            with transaction.commit_on_success():
+                self.filter(due, pk__in=pks).update(verification_sent=now)
+            for user_profile in self.filter(pk__in=pks, verification_sent=now).select_related('user'):
+                user_profile.send_email()
+                count += 1
+        return count
+
+    def request_verification_resend(self, queryset):
+        """
+        Marks unverified profiles of the queryset for ResendVerificationJob of 'manage.py maintenance',
+        in chunks of BULK_UPDATE_CHUNK_SIZE profiles. Returns number of marked profiles.
+        """
+        marked = 0
+        queryset = queryset.filter(verification_requested=False).exclude(verification_key=self.model.VERIFIED).order_by()
+        while True:
+            # Marked rows leave the queryset, so every chunk is selected from the start.
+            pks = list(queryset.values_list('pk', flat=True)[:settings.BULK_UPDATE_CHUNK_SIZE])
+            if not pks:
+                break
+            with transaction.commit_on_success():
+                marked += self.filter(pk__in=pks, verification_requested=False).update(verification_requested=True)
+        return marked
+
+    def set_subscribed_by_emails(self, emails, subscribed):
+        """
+        Subscribes or unsubscribes users by emails. Emails may be any iterable, e.g. a file, they are
+        consumed in chunks of BULK_UPDATE_CHUNK_SIZE, so memory usage does not depend on the stream length.
+        Emails are looked up in lower case and as given, so an email of an old user stored in another case
+        may not match. Returns tuple (number of processed emails, number of emails matching users,
+        number of updated profiles).
+        """
+        processed, matched, updated = 0, 0, 0
+        emails = iter(emails)
+        while True:
+            chunk = list(islice(emails, settings.BULK_UPDATE_CHUNK_SIZE // 2))
+            if not chunk:
+                break
+            processed += len(chunk)
+            normalized = [self.normalize_email(email) for email in chunk]
+            users = dict(User.objects.filter(email__in=set(chunk + normalized)).values_list('email', 'pk'))
+            matched += sum(1 for email, normalized_email in zip(chunk, normalized)
+                           if email in users or normalized_email in users)
+            updated += self.set_subscribed(list(set(users.values())), subscribed)
+        return processed, matched, updated
+
 class UserProfile(models.Model):
     """
     Keeps needed additional user data.
@@ -61,8 +185,12 @@ class UserProfile(models.Model):
     objects = UserProfileManager()
 
     user = models.OneToOneField(User, related_name='profile')
-    verification_key = models.CharField(max_length=40)
-    subscribed = models.BooleanField(default=False)
+    verification_key = models.CharField(max_length=40, db_index=True)
+    subscribed = models.BooleanField(default=False, db_index=True)
+    # Time of the last resent verification email.
+    verification_sent = models.DateTimeField(null=True, blank=True)
+    # Verification email to be resent by the maintenance job.
+    verification_requested = models.BooleanField(default=False, db_index=True)
 
     def __unicode__(self):
         return u'%s %s' % (self.user.first_name, self.user.last_name)
@@ -71,17 +199,185 @@ class UserProfile(models.Model):
     def is_verified(self):
         return self.verification_key == self.VERIFIED
 
+    def update_subscribed(self, subscribed):
+        """
+        Subscribes or unsubscribes the user, updates only the 'subscribed' column.
+        """
+        with transaction.commit_on_success():
+            changed = UserProfile.objects.filter(pk=self.pk, subscribed=not subscribed).update(subscribed=subscribed)
+            if changed:
+                UserStat.objects.increment(UserStat.SUBSCRIBED, 1 if subscribed else -1)
+        if changed:
+            event_log.append(events.SUBSCRIBED if subscribed else events.UNSUBSCRIBED, [self.user_id])
+        self.subscribed = subscribed
+        self._loaded_state = (self.is_verified, subscribed)
+
     def send_email(self):
         """
         Sends an email with verification data
         """
-        context = {
+        queue_mail(self.get_verification_email())
+
+    def get_verification_context(self):
+        """
+        Context of the verification email templates
+        """
+        return {
             'user': self.user,
+            'profile': self,
             'host': settings.HOST,
             'verification_key': self.verification_key,
+            'verification_url': settings.HOST + reverse('verification', kwargs={'key': self.verification_key}),
         }
+
+    def get_verification_email(self):
+        """
+        Builds an email with verification data
+        """
         subject = u'Welcome, %s' % self.user.last_name
-        html_content = render_to_string('service/mail/verification_email.html',context)
-        msg = EmailMultiAlternatives(subject, strip_tags(html_content), settings.EMAIL_FROM_DEFAULT, [self.user.email])
-        msg.attach_alternative(html_content, "text/html")
-        msg.send()
+        return build_mail('service/mail/verification_email', self.get_verification_context(), subject, [self.user.email])
+
+
+class LoginActivity(models.Model):
+    """
+    Login attempt, it's written in batches by service.activity.recorder.
+    """
+    user = models.ForeignKey(User, null=True, related_name='login_activity')
+    email = models.CharField(max_length=75)
+    ip_address = models.GenericIPAddressField(null=True)
+    created = models.DateTimeField(db_index=True)
+    success = models.BooleanField(default=False)
+
+    def __unicode__(self):
+        return u'%s %s %s' % (self.email, self.created, 'success' if self.success else 'failure')
+
+
+class UserStatManager(models.Manager):
+    """
+    Custom Manager for UserStat model
+    """
+    def increment(self, key, delta=1):
+        """
+        Adds delta to the counter, it's expected to be called inside the transaction that changes the users.
+        """
+        if not delta:
+            return
+        if self.filter(key=key).update(value=F('value') + delta):
+            return
+        sid = transaction.savepoint()
+        try:
+            self.create(key=key, value=delta)
+            transaction.savepoint_commit(sid)
+        except IntegrityError:
+            transaction.savepoint_rollback(sid)
+            self.filter(key=key).update(value=F('value') + delta)
+
+    def get_value(self, key, default=0):
+        try:
+            return self.get(key=key).value
+        except self.model.DoesNotExist:
+            return default
+
+    def get_values(self, keys):
+        values = dict.fromkeys(keys, 0)
+        values.update(self.filter(key__in=keys).values_list('key', 'value'))
+        return values
+
+    def set_values(self, values):
+        """
+        Overwrites counters, used by reconciliation.
+        """
+        with transaction.commit_on_success():
+            for key, value in values.items():
+                if not self.filter(key=key).update(value=value):
+                    self.create(key=key, value=value)
+
+
+class UserStat(models.Model):
+    """
+    Counters of users maintained along with the changes of users, so statistics do not need COUNT(*) scans.
+    Use 'manage.py reconcile_user_stats' to recount them.
+    """
+    USERS = 'users'
+    PROFILES = 'profiles'
+    VERIFIED = 'verified'
+    SUBSCRIBED = 'subscribed'
+
+    objects = UserStatManager()
+
+    key = models.CharField(max_length=40, unique=True)
+    value = models.BigIntegerField(default=0)
+
+    def __unicode__(self):
+        return u'%s: %s' % (self.key, self.value)
+
+    @staticmethod
+    def registrations_key(date):
+        return 'registrations:%s' % date.isoformat()
+
+    @staticmethod
+    def date_of(value):
+        return timezone.localtime(value).date() if timezone.is_aware(value) else value.date()
+
+
+def remember_user_email(sender, instance, **kwargs):
+    instance._loaded_email = instance.email
+
+def update_email_filter(sender, instance, created, **kwargs):
+    """
+    Keeps the email filter in sync with saved users.
+    """
+    if created or instance.email != getattr(instance, '_loaded_email', None):
+        if not created:
+            email_filter.invalidate()
+        email_filter.add(instance)
+        instance._loaded_email = instance.email
+
+def invalidate_email_filter(sender, instance, **kwargs):
+    """
+    Rebuilds the email filter after a user is deleted: SQLite reuses the id of the newest user,
+    so a registration with the same id would not be picked up through the max user id.
+    """
+    email_filter.invalidate()
+
+def remember_profile_state(sender, instance, **kwargs):
+    instance._loaded_state = (instance.pk is not None and instance.is_verified, instance.pk is not None and instance.subscribed)
+
+def update_user_stats(sender, instance, **kwargs):
+    """
+    Keeps UserStat counters in sync with saved and deleted users and profiles.
+    Registrations of a day are never decremented, they count users registered that day.
+    """
+    if sender is User:
+        if kwargs.get('created') is None:
+            UserStat.objects.increment(UserStat.USERS, -1)
+        elif kwargs['created']:
+            UserStat.objects.increment(UserStat.USERS, 1)
+            UserStat.objects.increment(UserStat.registrations_key(UserStat.date_of(instance.date_joined)), 1)
+        return
+    verified, subscribed = getattr(instance, '_loaded_state', (False, False))
+    if kwargs.get('created') is None:
+        UserStat.objects.increment(UserStat.PROFILES, -1)
+        new_verified, new_subscribed = False, False
+    else:
+        UserStat.objects.increment(UserStat.PROFILES, int(kwargs['created']))
+        new_verified, new_subscribed = instance.is_verified, instance.subscribed
+    UserStat.objects.increment(UserStat.VERIFIED, int(new_verified) - int(verified))
+    UserStat.objects.increment(UserStat.SUBSCRIBED, int(new_subscribed) - int(subscribed))
+    instance._loaded_state = (new_verified, new_subscribed)
+
+def invalidate_user_cache(sender, instance, **kwargs):
+    user_cache.invalidate(instance.pk if sender is User else instance.user_id)
+
+post_init.connect(remember_user_email, sender=User)
+post_init.connect(remember_profile_state, sender=UserProfile)
+post_save.connect(update_email_filter, sender=User)
+post_delete.connect(invalidate_email_filter, sender=User)
+request_finished.connect(email_filter.invalidate_pending)
+for model in (User, UserProfile):
+    post_save.connect(invalidate_user_cache, sender=model)
+    post_delete.connect(invalidate_user_cache, sender=model)
+    post_save.connect(update_user_stats, sender=model)
+    post_delete.connect(update_user_stats, sender=model)
+user_logged_in.disconnect(update_last_login)
+user_logged_in.connect(record_login)
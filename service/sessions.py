@@ -0,0 +1,35 @@
+"""
+Database session engine which knows whether the session data have actually changed.
+
+Used with service.middleware.SessionMiddleware, which skips saving a session that was
+marked as modified but has the same data as loaded from the database.
+"""
+import hashlib
+import cPickle as pickle
+from django.contrib.sessions.backends.db import SessionStore as DatabaseSessionStore
+
+class SessionStore(DatabaseSessionStore):
+    """
+    Remembers digest of the loaded session data.
+    """
+    _loaded_key = _loaded_digest = None
+
+    def load(self):
+        session_key = self.session_key
+        data = super(SessionStore, self).load()
+        # load() creates a new session if the key is unknown, the new key must be sent to the client.
+        self._loaded_key, self._loaded_digest = session_key, self._digest(data)
+        return data
+
+    def _digest(self, data):
+        return hashlib.md5(pickle.dumps(data, pickle.HIGHEST_PROTOCOL)).digest()
+
+    def has_changed(self):
+        """
+        Returns True if the session data or key differ from the loaded ones.
+        """
+        if not self.modified:
+            return False
+        if self._loaded_digest is None or self.session_key != self._loaded_key:
+            return True
+        return self._digest(self._session) != self._loaded_digest
@@ -0,0 +1,94 @@
+"""
+State shared by all processes of the node, e.g. by uWSGI workers.
+"""
+import fcntl
+import mmap
+import os
+import struct
+import threading
+from contextlib import contextmanager
+from django.conf import settings
+
+def threads_enabled():
+    """
+    False in a uWSGI worker started without enable-threads (or threads), where threads
+    started by the application never run.
+    """
+    try:
+        import uwsgi
+    except ImportError:
+        return True
+    return bool(uwsgi.opt.get('enable-threads') or uwsgi.opt.get('threads'))
+
+class SharedCounters(object):
+    """
+    Fixed size array of unsigned 64-bit counters kept in a memory-mapped file.
+    Reads are lock free, writes are serialized with a lock on the file.
+    """
+    FORMAT = '<Q'
+    ITEM_SIZE = struct.calcsize(FORMAT)
+
+    def __init__(self, name, size):
+        self.name, self.size = name, size
+        self._mmap = None
+        self._file = None
+        self._lock = threading.Lock()
+
+    @property
+    def path(self):
+        return os.path.join(settings.SHARED_STATE_DIR, self.name)
+
+    def get(self, index):
+        return struct.unpack_from(self.FORMAT, self._get_mmap(), index * self.ITEM_SIZE)[0]
+
+    def increment(self, index):
+        """
+        Increments the counter and returns the new value.
+        """
+        with self._locked() as counters:
+            value = struct.unpack_from(self.FORMAT, counters, index * self.ITEM_SIZE)[0] + 1
+            struct.pack_into(self.FORMAT, counters, index * self.ITEM_SIZE, value)
+        return value
+
+    def update_max(self, index, value):
+        """
+        Sets the counter to the value if the value is greater than the counter.
+        """
+        with self._locked() as counters:
+            if value > struct.unpack_from(self.FORMAT, counters, index * self.ITEM_SIZE)[0]:
+                struct.pack_into(self.FORMAT, counters, index * self.ITEM_SIZE, value)
+
+    @contextmanager
+    def _locked(self):
+        # lockf() locks are owned by the process, so they work for descriptors inherited through fork.
+        counters = self._get_mmap()
+        with self._lock:
+            fcntl.lockf(self._file, fcntl.LOCK_EX)
+            try:
+                yield counters
+            finally:
+                fcntl.lockf(self._file, fcntl.LOCK_UN)
+
+    def _get_mmap(self):
+        if self._mmap is None:
+            with self._lock:
+                if self._mmap is None:
+                    self._open()
+        return self._mmap
+
+    def _open(self):
+        if not os.path.isdir(settings.SHARED_STATE_DIR):
+            try:
+                os.makedirs(settings.SHARED_STATE_DIR)
+            except OSError:
+                if not os.path.isdir(settings.SHARED_STATE_DIR):
+                    raise
+        length = self.size * self.ITEM_SIZE
+        self._file = open(self.path, 'a+b')
+        fcntl.lockf(self._file, fcntl.LOCK_EX)
+        try:
+            if os.fstat(self._file.fileno()).st_size < length:
+                self._file.truncate(length)
+        finally:
+            fcntl.lockf(self._file, fcntl.LOCK_UN)
+        self._mmap = mmap.mmap(self._file.fileno(), length)
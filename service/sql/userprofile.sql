@@ -0,0 +1,6 @@
+-- Executed by syncdb after the service_userprofile table is created.
+-- auth_user.email is the login and is looked up on every authentication and bulk subscription update.
+CREATE INDEX service_auth_user_email ON auth_user (email);
+-- Prefix search of the admin.
+CREATE INDEX service_auth_user_first_name ON auth_user (first_name);
+CREATE INDEX service_auth_user_last_name ON auth_user (last_name);
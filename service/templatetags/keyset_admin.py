@@ -0,0 +1,17 @@
+from django import template
+from django.contrib.admin.templatetags.admin_list import result_list
+
+register = template.Library()
+
+@register.inclusion_tag('admin/change_list_results.html')
+def keyset_result_list(cl):
+    """
+    Like result_list of the admin, but the headers are not sortable: KeysetChangeList
+    is always ordered by descending primary key.
+    """
+    context = result_list(cl)
+    for header in context['result_headers']:
+        if header['sortable']:
+            header.update(sortable=False, class_attrib='')
+    context['num_sorted_fields'] = 0
+    return context
@@ -1,3 +1,13 @@
 from service.tests.models import *
 from service.tests.forms import *
-from service.tests.views import *
\ No newline at end of file
+from service.tests.views import *
+from service.tests.api import *
+from service.tests.commands import *
+from service.tests.bloom import *
+from service.tests.breached import *
+from service.tests.activity import *
+from service.tests.cache import *
+from service.tests.stats import *
+from service.tests.admin import *
+from service.tests.maintenance import *
+from service.tests.events import *
@@ -0,0 +1,75 @@
+from datetime import timedelta
+from django.contrib.auth.models import User
+from django.core.urlresolvers import reverse
+from django.test import TestCase
+from django.test.utils import override_settings
+from django.utils import timezone
+
+from service.activity import recorder
+from service.models import LoginActivity
+from service.tests.factories import create_user
+
+class ActivityRecorderTests(TestCase):
+    """
+    Test the buffered login activity.
+    """
+    user_data = {'email': 'txtr@txtr.com',
+                 'password': 'txtr_password1',
+                 'first_name': 'first_name',
+                 'last_name': 'last_name',}
+
+    def setUp(self):
+        recorder.clear()
+        self.user = create_user(**self.user_data)
+        User.objects.filter(pk=self.user.pk).update(last_login=timezone.now() - timedelta(days=1))
+
+    def tearDown(self):
+        self.user = None
+        recorder.clear()
+
+    def login(self, password):
+        return self.client.post(reverse('login'), data={'username': self.user_data['email'], 'password': password})
+
+    @override_settings(LOGIN_ACTIVITY_BUFFER_SIZE=3, LOGIN_ACTIVITY_FLUSH_INTERVAL=60)
+    def test_buffered_logins(self):
+        """
+        Logins are written in one batch when the buffer is full.
+        """
+        last_login = User.objects.get(pk=self.user.pk).last_login
+        self.login(self.user_data['password'])
+        self.client.logout()
+        self.login('foo')
+
+        self.assertEqual(len(recorder), 2)
+        self.assertEqual(LoginActivity.objects.count(), 0)
+        self.assertEqual(User.objects.get(pk=self.user.pk).last_login, last_login)
+
+        self.login(self.user_data['password'])
+        self.assertEqual(len(recorder), 0)
+        self.assertEqual(LoginActivity.objects.filter(user=self.user, success=True).count(), 2)
+        self.assertEqual(LoginActivity.objects.filter(user=None, email=self.user_data['email'], success=False).count(), 1)
+        self.assertEqual(User.objects.get(pk=self.user.pk).last_login,
+            LoginActivity.objects.filter(success=True).latest('created').created)
+
+    @override_settings(LOGIN_ACTIVITY_BUFFER_SIZE=1)
+    def test_write_through(self):
+        """
+        Every login is written immediately with buffer size 1.
+        """
+        self.login(self.user_data['password'])
+        activity = LoginActivity.objects.get()
+        self.assertEqual(activity.ip_address, '127.0.0.1')
+        self.assertEqual(User.objects.get(pk=self.user.pk).last_login, activity.created)
+
+    @override_settings(LOGIN_ACTIVITY_BUFFER_SIZE=3, LOGIN_ACTIVITY_FLUSH_INTERVAL=0)
+    def test_flush_if_due(self):
+        """
+        Buffered logins are written once the oldest one is older than the flush interval.
+        """
+        with override_settings(LOGIN_ACTIVITY_FLUSH_INTERVAL=60):
+            self.login(self.user_data['password'])
+            recorder.flush_if_due()
+        self.assertEqual(len(recorder), 1)
+        recorder.flush_if_due()
+        self.assertEqual(len(recorder), 0)
+        self.assertEqual(LoginActivity.objects.count(), 1)
@@ -0,0 +1,120 @@
+from django.contrib.admin import autodiscover, site
+from django.contrib.auth.models import User
+from django.core import mail
+from django.core.urlresolvers import reverse
+from django.test import TestCase
+from django.test.utils import override_settings
+
+from service.activity import recorder
+from service.maintenance import Scheduler, ResendVerificationJob
+from service.models import UserProfile, UserStat
+from service.tests.factories import create_users
+
+class UserProfileAdminTests(TestCase):
+    """
+    Test the profiles admin.
+    """
+    def setUp(self):
+        self.profiles = [user.profile for user in create_users(['txtr%d@txtr.com' % i for i in range(5)],
+                                                               first_name='First%d', last_name='Last%d')]
+        User.objects.create_superuser('admin', 'admin@txtr.com', 'admin1')
+        self.client.login(username='admin@txtr.com', password='admin1')
+        autodiscover()
+        self.model_admin = site._registry[UserProfile]
+        self.model_admin.list_per_page = 2
+        mail.outbox = []
+
+    def tearDown(self):
+        self.model_admin.list_per_page = 100
+        mail.outbox = []
+        # Logins of the test client are buffered.
+        recorder.clear()
+
+    def changelist(self, **params):
+        response = self.client.get(reverse('admin:service_userprofile_changelist'), params)
+        self.assertEqual(response.status_code, 200)
+        return response.context['cl']
+
+    def test_keyset_pagination(self):
+        """
+        Pages are selected by the last primary key of the previous page.
+        """
+        cl = self.changelist()
+        self.assertEqual(cl.result_list, self.profiles[:2:-1])
+        self.assertEqual(cl.result_count, 5)
+        cl = self.changelist(after=cl.next_after)
+        self.assertEqual(cl.result_list, self.profiles[2:0:-1])
+        cl = self.changelist(after=cl.next_after)
+        self.assertEqual(cl.result_list, self.profiles[:1])
+        self.assertFalse(cl.has_next)
+
+    def test_headers_not_sortable(self):
+        """
+        Columns can't be sorted, objects are always ordered by descending primary key.
+        """
+        response = self.client.get(reverse('admin:service_userprofile_changelist'))
+        self.assertNotContains(response, 'sortable')
+        self.assertNotContains(response, '?o=')
+
+    def test_prefix_search(self):
+        """
+        Search finds profiles by prefix of email or name.
+        """
+        self.assertEqual(self.changelist(q='TXTR3').result_list, [self.profiles[3]])
+        self.assertEqual(self.changelist(q='last4').result_list, [self.profiles[4]])
+        self.assertEqual(self.changelist(q='xtr').result_list, [])
+
+    def test_filters(self):
+        """
+        Filters by verification and subscription with estimated counts.
+        """
+        UserProfile.objects.verification(self.profiles[0].verification_key)
+        cl = self.changelist(verified='1')
+        self.assertEqual(cl.result_list, [self.profiles[0]])
+        self.assertEqual(cl.result_count, 1)
+        cl = self.changelist(verified='0')
+        self.assertEqual(cl.result_count, 4)
+        self.assertEqual(self.changelist(subscribed__exact='1').result_list, [])
+
+    def test_actions(self):
+        """
+        Bulk actions unsubscribe and resend verification emails.
+        """
+        UserProfile.objects.update_subscribed(UserProfile.objects.all(), True)
+        UserProfile.objects.verification(self.profiles[0].verification_key)
+        url = reverse('admin:service_userprofile_changelist')
+        selected = [profile.pk for profile in self.profiles[:3]]
+
+        self.client.post(url, {'action': 'unsubscribe', '_selected_action': selected})
+        self.assertEqual(UserProfile.objects.filter(subscribed=True).count(), 2)
+        self.assertEqual(UserStat.objects.get_value(UserStat.SUBSCRIBED), 2)
+
+        self.client.post(url, {'action': 'resend_verification', '_selected_action': selected})
+        self.assertEqual(sorted(message.to[0] for message in mail.outbox), ['txtr1@txtr.com', 'txtr2@txtr.com'])
+
+    @override_settings(VERIFICATION_RESEND_ADMIN_LIMIT=2)
+    def test_resend_in_background(self):
+        """
+        Verification emails of big selections are resent by the maintenance job.
+        """
+        url = reverse('admin:service_userprofile_changelist')
+        selected = [profile.pk for profile in self.profiles[:3]]
+        self.client.post(url, {'action': 'resend_verification', '_selected_action': selected})
+        self.assertEqual(mail.outbox, [])
+        self.assertEqual(UserProfile.objects.filter(verification_requested=True).count(), 3)
+
+        report = Scheduler([ResendVerificationJob()]).run_pending()[0]
+        self.assertEqual(report.rows, 3)
+        self.assertEqual(sorted(message.to[0] for message in mail.outbox),
+                         ['txtr0@txtr.com', 'txtr1@txtr.com', 'txtr2@txtr.com'])
+        self.assertFalse(UserProfile.objects.filter(verification_requested=True).exists())
+
+    def test_missing_counters(self):
+        """
+        Without the counters (e.g. on a database that was not reconciled) the count is not an estimate
+        and bulk actions are available.
+        """
+        UserStat.objects.all().delete()
+        response = self.client.get(reverse('admin:service_userprofile_changelist'), {'after': self.profiles[3].pk})
+        self.assertEqual(response.context['cl'].result_count, 2)
+        self.assertContains(response, 'name="action"')
@@ -0,0 +1,157 @@
+import json
+from django.contrib.auth.models import User
+from django.test import TestCase
+from django.core import mail
+from django.core.urlresolvers import reverse
+from django.test.utils import override_settings
+
+from service.activity import recorder
+from service.api import create_token
+from service.models import UserProfile
+from service.tests.factories import create_user, create_users
+
+class ApiTests(TestCase):
+    """
+    Test the JSON API.
+    """
+    user_data = {'email': 'txtr@txtr.com',
+                 'password': 'txtr_password1',
+                 'first_name': 'first_name',
+                 'last_name': 'last_name',}
+
+    def setUp(self):
+        self.user = create_user(**self.user_data)
+        mail.outbox = []
+
+    def tearDown(self):
+        self.user = None
+        mail.outbox = []
+        # Logins of the test client are buffered.
+        recorder.clear()
+
+    def post(self, name, data, token=None):
+        extra = {'HTTP_AUTHORIZATION': 'Token %s' % token} if token else {}
+        response = self.client.post(reverse(name), json.dumps(data), content_type='application/json', **extra)
+        return response, json.loads(response.content)
+
+    def test_register(self):
+        """
+        Registers new user and returns a token.
+        """
+        response, data = self.post('api_register', {'email': 'new_txtr@txtr.com',
+                                                    'first_name': self.user_data['first_name'],
+                                                    'last_name': self.user_data['last_name'],
+                                                    'password1': self.user_data['password'],
+                                                    'password2': self.user_data['password']})
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(User.objects.get(pk=data['id']).email, 'new_txtr@txtr.com')
+        self.assertTrue(data['token'])
+        self.assertEqual(len(mail.outbox), 1)
+
+    def test_register_invalid(self):
+        """
+        Returns form errors if email already exists.
+        """
+        response, data = self.post('api_register', {'email': self.user_data['email'],
+                                                    'first_name': self.user_data['first_name'],
+                                                    'last_name': self.user_data['last_name'],
+                                                    'password1': self.user_data['password'],
+                                                    'password2': self.user_data['password']})
+        self.assertEqual(response.status_code, 400)
+        self.assertTrue('email' in data['errors'])
+
+    def test_authenticate(self):
+        """
+        Returns token for valid email and password only.
+        """
+        response, data = self.post('api_authenticate', {'email': self.user_data['email'],
+                                                        'password': self.user_data['password']})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(data['id'], self.user.pk)
+
+        response, data = self.post('api_authenticate', {'email': self.user_data['email'], 'password': 'foo'})
+        self.assertEqual(response.status_code, 401)
+
+    def test_verify(self):
+        """
+        Verifies email by the key.
+        """
+        response, data = self.post('api_verify', {'key': self.user.profile.verification_key})
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(UserProfile.objects.get(user=self.user).is_verified)
+
+        response, data = self.post('api_verify', {'key': UserProfile.VERIFIED})
+        self.assertEqual(response.status_code, 404)
+
+    def test_token_required(self):
+        """
+        Requests without a valid token are rejected.
+        """
+        response, data = self.post('api_subscribe', {'subscribe': True})
+        self.assertEqual(response.status_code, 401)
+        response, data = self.post('api_subscribe', {'subscribe': True}, token='invalid')
+        self.assertEqual(response.status_code, 401)
+
+    def test_change_password(self):
+        """
+        Changes password, the old token becomes invalid.
+        """
+        token = create_token(self.user)
+        response, data = self.post('api_change_password', {'old_password': self.user_data['password'],
+                                                           'new_password1': 'new_password1',
+                                                           'new_password2': 'new_password1'}, token=token)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(User.objects.get(pk=self.user.pk).check_password('new_password1'))
+
+        response, data = self.post('api_subscribe', {'subscribe': True}, token=token)
+        self.assertEqual(response.status_code, 401)
+
+    def test_resend_verification(self):
+        """
+        Resends the verification email once per window, not to verified users.
+        """
+        for i in range(3):
+            response, data = self.post('api_resend_verification', {}, token=create_token(self.user))
+            self.assertEqual(response.status_code, 202)
+        self.assertEqual(len(mail.outbox), 1)
+
+        UserProfile.objects.verification(self.user.profile.verification_key)
+        response, data = self.post('api_resend_verification', {}, token=create_token(self.user))
+        self.assertEqual(response.status_code, 400)
+
+    def test_subscribe(self):
+        """
+        Subscribes the token user.
+        """
+        response, data = self.post('api_subscribe', {'subscribe': True}, token=create_token(self.user))
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(data['subscribed'])
+        self.assertTrue(UserProfile.objects.get(user=self.user).subscribed)
+
+    @override_settings(BULK_UPDATE_CHUNK_SIZE=2)
+    def test_subscribe_batch(self):
+        """
+        Subscribes many users at once, staff only.
+        """
+        users = [self.user] + create_users(['txtr%d@txtr.com' % i for i in range(4)])
+        user_ids = [user.pk for user in users]
+        response, data = self.post('api_subscribe_batch', {'user_ids': user_ids, 'subscribe': True},
+            token=create_token(self.user))
+        self.assertEqual(response.status_code, 403)
+
+        User.objects.filter(pk=self.user.pk).update(is_staff=True)
+        response, data = self.post('api_subscribe_batch', {'user_ids': user_ids[1:], 'subscribe': True},
+            token=create_token(self.user))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(data['updated'], 4)
+        self.assertEqual(UserProfile.objects.filter(subscribed=True).count(), 4)
+        self.assertFalse(UserProfile.objects.get(user=self.user).subscribed)
+
+    def test_cache_stats(self):
+        """
+        Returns user cache statistics, staff only.
+        """
+        User.objects.filter(pk=self.user.pk).update(is_staff=True)
+        response, data = self.post('api_cache_stats', {}, token=create_token(self.user))
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue('hit_rate' in data['users'])
@@ -0,0 +1,97 @@
+from django.contrib.auth.models import User
+from django.core.signals import request_finished
+from django.db import transaction
+from django.test import TestCase
+
+from service.bloom import BloomFilter, EmailFilter, email_filter
+from service.forms import RegistrationForm
+from service.models import UserProfile
+
+class BloomFilterTests(TestCase):
+    """
+    Test the bloom filter.
+    """
+    def test_membership(self):
+        """
+        Added values are always found, the false positive rate stays near the configured one.
+        """
+        bloom = BloomFilter(1000, 0.01)
+        for i in range(1000):
+            bloom.add('txtr%d@txtr.com' % i)
+
+        self.assertEqual(len(bloom), 1000)
+        self.assertTrue(all('txtr%d@txtr.com' % i in bloom for i in range(1000)))
+        false_positives = sum(1 for i in range(10000) if 'unknown%d@txtr.com' % i in bloom)
+        self.assertTrue(false_positives < 300)
+        self.assertTrue(abs(bloom.false_positive_rate - 0.01) < 0.005)
+
+
+class EmailFilterTests(TestCase):
+    """
+    Test the email filter.
+    """
+    user_data = {'email': 'txtr@txtr.com',
+                 'password': 'txtr_password1',
+                 'first_name': 'first_name',
+                 'last_name': 'last_name',}
+
+    def test_registered_user(self):
+        """
+        Registered and changed emails are found, unknown are not.
+        """
+        email_filter.build()
+        user = UserProfile.objects.create_user(**self.user_data)
+
+        self.assertTrue(email_filter.might_exist('TXTR@txtr.com'))
+        self.assertFalse(email_filter.might_exist('unknown@txtr.com'))
+
+        user.email = 'changed@txtr.com'
+        user.save()
+        self.assertTrue(email_filter.might_exist('changed@txtr.com'))
+
+    def test_changed_email_invalidated_after_commit(self):
+        """
+        Email changed in a transaction invalidates the filter again when the request is finished,
+        a process could have rebuilt it before the commit.
+        """
+        user = UserProfile.objects.create_user(**self.user_data)
+        generation = email_filter.shared.get(email_filter.GENERATION)
+        with transaction.commit_on_success():
+            user.email = 'changed@txtr.com'
+            user.save()
+        self.assertEqual(email_filter.shared.get(email_filter.GENERATION), generation + 1)
+
+        request_finished.send(sender=self.__class__)
+        self.assertEqual(email_filter.shared.get(email_filter.GENERATION), generation + 2)
+        request_finished.send(sender=self.__class__)
+        self.assertEqual(email_filter.shared.get(email_filter.GENERATION), generation + 2)
+
+    def test_deleted_user_id_reused(self):
+        """
+        A registration reusing the id of a deleted user is found by other processes.
+        """
+        other_process = EmailFilter()
+        user = UserProfile.objects.create_user(**self.user_data)
+        self.assertTrue(other_process.might_exist(self.user_data['email']))
+
+        user_id = user.pk
+        user.delete()
+        new_user = UserProfile.objects.create_user(**dict(self.user_data, email='new@txtr.com'))
+        self.assertEqual(new_user.pk, user_id)
+        self.assertTrue(other_process.might_exist('new@txtr.com'))
+
+    def test_users_added_by_other_process(self):
+        """
+        Users saved without signals (e.g. by another process) are picked up through the shared max user id.
+        """
+        email_filter.build()
+        User.objects.bulk_create([User(username='other', email='other@txtr.com')])
+        email_filter.shared.update_max(email_filter.LAST_USER_ID, User.objects.get(username='other').pk)
+
+        self.assertTrue(email_filter.might_exist('other@txtr.com'))
+        form = RegistrationForm(data={'email': 'other@txtr.com',
+                                      'first_name': self.user_data['first_name'],
+                                      'last_name': self.user_data['last_name'],
+                                      'password1': self.user_data['password'],
+                                      'password2': self.user_data['password']})
+        self.assertFalse(form.is_valid())
@@ -0,0 +1,66 @@
+import hashlib
+import os
+import shutil
+import tempfile
+from StringIO import StringIO
+from django.core.management import call_command
+from django.test import TestCase
+from django.test.utils import override_settings
+
+from service.breached import BreachedPasswords
+from service.forms import RegistrationForm, PasswordChangeForm
+from service.models import UserProfile
+
+class BreachedPasswordsTests(TestCase):
+    """
+    Test the breached passwords corpus.
+    """
+    breached = ['password1', 'qwerty123', '123456', 'letmein1']
+
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.corpus_path = os.path.join(self.temp_dir, 'breached.bin')
+        dump_path = os.path.join(self.temp_dir, 'dump.txt')
+        with open(dump_path, 'w') as dump:
+            for password in self.breached + self.breached:
+                dump.write('%s:%d\n' % (hashlib.sha1(password).hexdigest().upper(), len(password)))
+            dump.write('not a digest\n')
+        call_command('build_breached_passwords', dump_path, self.corpus_path, stdout=StringIO())
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def test_lookup(self):
+        """
+        Breached passwords are found, others are not. Duplicates are stored once.
+        """
+        corpus = BreachedPasswords(self.corpus_path)
+        self.assertEqual(len(corpus), len(self.breached))
+        for password in self.breached:
+            self.assertTrue(password in corpus)
+        self.assertFalse('txtr_password1' in corpus)
+        self.assertFalse(u'p\xe4ssword1' in corpus)
+        corpus.close()
+
+    def test_forms(self):
+        """
+        Registration and password change forms reject breached passwords.
+        """
+        with override_settings(BREACHED_PASSWORDS_FILE=self.corpus_path):
+            form = RegistrationForm(data={'email': 'txtr@txtr.com',
+                                          'first_name': 'first_name',
+                                          'last_name': 'last_name',
+                                          'password1': 'password1',
+                                          'password2': 'password1'})
+            self.assertFalse(form.is_valid())
+            self.assertTrue('password1' in form.errors)
+
+            user = UserProfile.objects.create_user('txtr@txtr.com', 'txtr_password1', 'first_name', 'last_name')
+            form = PasswordChangeForm(user, {'old_password': 'txtr_password1',
+                                             'new_password1': 'qwerty123',
+                                             'new_password2': 'qwerty123'})
+            self.assertFalse(form.is_valid())
+            form = PasswordChangeForm(user, {'old_password': 'txtr_password1',
+                                             'new_password1': 'txtr_password2',
+                                             'new_password2': 'txtr_password2'})
+            self.assertTrue(form.is_valid())
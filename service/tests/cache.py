@@ -0,0 +1,101 @@
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase
+
+from service.backends import EmailModelBackend
+from service.cache import TwoTierCache
+from service.models import UserProfile
+from service.tests.factories import create_user
+
+class TwoTierCacheTests(TestCase):
+    """
+    Test the two-tier cache.
+    """
+    def setUp(self):
+        self.cache = TwoTierCache('test', maxsize=2, ttl=60, slots=16)
+        self.loaded = []
+        cache.clear()
+
+    def tearDown(self):
+        cache.clear()
+
+    def load(self, key):
+        self.loaded.append(key)
+        return {'key': key, 'version': len(self.loaded)}
+
+    def test_hits_and_eviction(self):
+        """
+        Values are loaded once, the least recently used entry is evicted from L1 and is found in L2.
+        """
+        self.assertEqual(self.cache.get(1, self.load)['key'], 1)
+        self.cache.get(2, self.load)
+        self.cache.get(1, self.load)
+        self.cache.get(3, self.load)
+        self.cache.get(2, self.load)
+
+        self.assertEqual(self.loaded, [1, 2, 3])
+        stats = self.cache.stats()
+        self.assertEqual((stats['hits'], stats['l2_hits'], stats['misses']), (1, 1, 3))
+        self.assertEqual((stats['size'], stats['evictions']), (2, 2))
+
+    def test_invalidation_by_other_process(self):
+        """
+        Bumped generation of the key's slot drops the L1 entry.
+        """
+        self.cache.get(1, self.load)
+        self.cache.generations.increment(self.cache._slot(1))
+        cache.clear()
+        self.assertEqual(self.cache.get(1, self.load)['version'], 2)
+
+        self.cache.invalidate(1)
+        self.assertEqual(self.cache.get(1, self.load)['version'], 3)
+
+    def test_ttl(self):
+        """
+        Expired entries are reloaded.
+        """
+        self.cache.ttl = -1
+        self.cache.get(1, self.load)
+        self.cache.get(1, self.load)
+        self.assertEqual(self.loaded, [1, 1])
+
+    def test_copies(self):
+        """
+        Changes of a returned value do not affect the cached one.
+        """
+        self.cache.get(1, self.load)['key'] = 'changed'
+        self.assertEqual(self.cache.get(1, self.load)['key'], 1)
+
+
+class UserCacheTests(TestCase):
+    """
+    Test caching of users in the authentication backend.
+    """
+    def test_get_user(self):
+        """
+        Saved users are invalidated.
+        """
+        user = UserProfile.objects.create_user('txtr@txtr.com', 'txtr_password1', 'first_name', 'last_name')
+        backend = EmailModelBackend()
+        self.assertEqual(backend.get_user(user.pk).first_name, 'first_name')
+
+        user.first_name = 'changed'
+        user.save()
+        self.assertEqual(backend.get_user(user.pk).first_name, 'changed')
+        self.assertEqual(backend.get_user(0), None)
+
+    def test_factory_reused_id(self):
+        """
+        Users created by the test factory replace a cached user with the same id, e.g. of an earlier test.
+        """
+        backend = EmailModelBackend()
+        user = create_user('a@txtr.com', 'txtr_password1', 'first_name', 'last_name')
+        self.assertEqual(backend.get_user(user.pk).email, 'a@txtr.com')
+        # Like the rollback of a test: no signals.
+        cursor = connection.cursor()
+        cursor.execute('DELETE FROM service_userprofile WHERE user_id = %s', [user.pk])
+        cursor.execute('DELETE FROM auth_user WHERE id = %s', [user.pk])
+
+        other = create_user('b@txtr.com', 'txtr_password1', 'first_name', 'last_name')
+        self.assertEqual(other.pk, user.pk)
+        self.assertEqual(backend.get_user(other.pk).email, 'b@txtr.com')
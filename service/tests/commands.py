@@ -0,0 +1,27 @@
+from StringIO import StringIO
+from tempfile import NamedTemporaryFile
+from django.core.management import call_command
+from django.test import TestCase
+
+from service.models import UserProfile
+
+class CommandTests(TestCase):
+    """
+    Test the management commands.
+    """
+    def test_suppress_emails(self):
+        """
+        Unsubscribes users listed in the file.
+        """
+        for i in range(3):
+            user = UserProfile.objects.create_user('txtr%d@txtr.com' % i, 'password1', 'first', 'last')
+        UserProfile.objects.update(subscribed=True)
+
+        with NamedTemporaryFile() as suppression_file:
+            suppression_file.write('# bounces\ntxtr0@txtr.com\n\n  txtr1@txtr.com  \nunknown@txtr.com\n')
+            suppression_file.flush()
+            stdout = StringIO()
+            call_command('suppress_emails', suppression_file.name, stdout=stdout)
+
+        self.assertEqual(stdout.getvalue(), '3 emails processed, 1 did not match any user, 2 profiles updated\n')
+        self.assertEqual(list(UserProfile.objects.filter(subscribed=True)), [user.profile])
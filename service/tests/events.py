@@ -0,0 +1,140 @@
+import json
+import os
+import shutil
+import time
+from StringIO import StringIO
+from tempfile import mkdtemp
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.core.urlresolvers import reverse
+from django.test import TestCase
+from django.test.utils import override_settings
+
+from service.api import create_token
+from service.events import event_log, InvalidOffset
+from service.forms import SubscribeForm
+from service.maintenance import Scheduler, EventLogJob
+from service.models import UserProfile
+
+class EventLogTests(TestCase):
+    """
+    Test the event log of user lifecycle events.
+    """
+    def setUp(self):
+        self.directory = mkdtemp()
+        self.override = override_settings(EVENT_LOG_DIR=self.directory)
+        self.override.enable()
+
+    def tearDown(self):
+        self.override.disable()
+        shutil.rmtree(self.directory)
+
+    def test_lifecycle(self):
+        """
+        Registration, verification and subscription changes are logged in order.
+        """
+        user = UserProfile.objects.create_user('txtr@txtr.com', 'txtr_password1', 'first', 'last')
+        UserProfile.objects.verification(user.profile.verification_key)
+        for i in range(2):
+            form = SubscribeForm(user, {'subscribe': True})
+            self.assertTrue(form.is_valid())
+            form.save()
+        UserProfile.objects.set_subscribed([user.pk], False)
+
+        events, offset = event_log.read(0)
+        self.assertEqual([(event['type'], event['user_id']) for event in events],
+                         [('registered', user.pk), ('verified', user.pk), ('subscribed', user.pk), ('unsubscribed', user.pk)])
+        self.assertEqual(events[0]['email'], 'txtr@txtr.com')
+        self.assertEqual(event_log.read(events[2]['offset'])[0], events[2:])
+        self.assertEqual(event_log.read(offset), ([], offset))
+
+    def test_bulk_subscribe(self):
+        """
+        Bulk updates log an event for every changed user.
+        """
+        users = [UserProfile.objects.create_user('txtr%d@txtr.com' % i, 'txtr_password1', 'first', 'last')
+                 for i in range(3)]
+        UserProfile.objects.filter(user=users[0]).update(subscribed=True)
+        offset = event_log.read(0)[1]
+
+        with override_settings(BULK_UPDATE_CHUNK_SIZE=1):
+            self.assertEqual(UserProfile.objects.set_subscribed([user.pk for user in users], True), 2)
+        events = event_log.read(offset)[0]
+        self.assertEqual([(event['type'], event['user_id']) for event in events],
+                         [('subscribed', users[1].pk), ('subscribed', users[2].pk)])
+
+    @override_settings(EVENT_LOG_SEGMENT_SIZE=200)
+    def test_segments(self):
+        """
+        Full segments are rolled over, offsets continue across segments.
+        """
+        for i in range(10):
+            event_log.append('registered', [i])
+        self.assertTrue(len(event_log.segments()) > 1)
+
+        events, offset = event_log.read(0, limit=4)
+        self.assertEqual([event['user_id'] for event in events], range(4))
+        events, offset = event_log.read(offset)
+        self.assertEqual([event['user_id'] for event in events], range(4, 10))
+        self.assertEqual(offset, sum(os.path.getsize(os.path.join(self.directory, name))
+                                     for name in os.listdir(self.directory) if name.endswith('.log')))
+
+    @override_settings(EVENT_LOG_SEGMENT_SIZE=200, EVENT_LOG_RETENTION_DAYS=1, MAINTENANCE_BATCH_PAUSE=0)
+    def test_prune(self):
+        """
+        Old segments are deleted, the current one is kept, reading continues at the oldest event.
+        """
+        for i in range(10):
+            event_log.append('registered', [i])
+        segments = event_log.segments()
+        old = time.time() - 2 * 24 * 60 * 60
+        for base in segments:
+            os.utime(os.path.join(self.directory, '%020d.log' % base), (old, old))
+
+        report = Scheduler([EventLogJob()]).run_pending()[0]
+        self.assertEqual(report.rows, len(segments) - 1)
+        self.assertEqual(event_log.segments(), segments[-1:])
+        self.assertEqual(event_log.read(0)[0][0]['offset'], segments[-1])
+
+    def test_api(self):
+        """
+        Returns events from the offset, staff only.
+        """
+        user = UserProfile.objects.create_user('txtr@txtr.com', 'txtr_password1', 'first', 'last')
+        url = reverse('api_events')
+        auth = {'HTTP_AUTHORIZATION': 'Token %s' % create_token(user)}
+        self.assertEqual(self.client.get(url, **auth).status_code, 403)
+
+        User.objects.filter(pk=user.pk).update(is_staff=True)
+        data = json.loads(self.client.get(url, {'offset': 0}, **auth).content)
+        self.assertEqual([event['type'] for event in data['events']], ['registered'])
+        started = time.time()
+        data = json.loads(self.client.get(url, {'offset': data['next_offset'], 'timeout': 0.3}, **auth).content)
+        self.assertEqual(data['events'], [])
+        self.assertTrue(time.time() - started >= 0.3)
+        self.assertEqual(self.client.get(url, {'offset': 'x'}, **auth).status_code, 400)
+        self.assertEqual(self.client.get(url, {'offset': 5}, **auth).status_code, 400)
+
+    def test_command(self):
+        """
+        'read_events' prints events from the offset as JSON lines.
+        """
+        for i in range(3):
+            event_log.append('registered', [i])
+        offset = event_log.read(0)[0][1]['offset']
+        stdout = StringIO()
+        call_command('read_events', offset=offset, stdout=stdout)
+        self.assertEqual([json.loads(line)['user_id'] for line in stdout.getvalue().splitlines()], [1, 2])
+        stderr = StringIO()
+        self.assertRaises(SystemExit, call_command, 'read_events', offset=offset + 1, stdout=stdout, stderr=stderr)
+        self.assertTrue('not at the start of an event' in stderr.getvalue())
+
+    def test_invalid_offset(self):
+        """
+        Offsets inside an event or after the end of the log are rejected.
+        """
+        event_log.append('registered', [1, 2])
+        events, offset = event_log.read(0)
+        self.assertEqual(event_log.read(events[1]['offset'])[0], events[1:])
+        self.assertRaises(InvalidOffset, event_log.read, 5)
+        self.assertRaises(InvalidOffset, event_log.read, offset + 1)
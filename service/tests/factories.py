@@ -0,0 +1,80 @@
+"""
+Fast creation of users for tests.
+
+Password hashes are computed once per password, users and profiles are inserted with
+bulk_create and no verification email is rendered. Signals are not sent for bulk inserts,
+so the side effects of registration that tests rely on (user statistics, the email filter
+and the user cache) are applied here.
+"""
+import hashlib
+from itertools import count
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.utils import timezone
+
+from service.bloom import email_filter
+from service.cache import user_cache
+from service.models import UserProfile, UserStat
+
+# Rows per INSERT, SQLite allows 999 query parameters and User has 11 columns.
+BULK_INSERT_SIZE = 50
+
+_password_hashes = {}
+_created = count()
+
+def get_password_hash(password):
+    if password not in _password_hashes:
+        _password_hashes[password] = make_password(password)
+    return _password_hashes[password]
+
+def create_users(emails, password='txtr_password1', first_name='first', last_name='last',
+                 verified=False, subscribed=False):
+    """
+    Creates users with profiles like UserProfileManager.create_user. '%d' in the names is replaced
+    with the index of the email. Returns list of users in the order of emails.
+    """
+    now = timezone.now()
+    users = []
+    for i, email in enumerate(emails):
+        # SQLite inserts the rows of a bulk INSERT in sorted order, usernames sort like the emails,
+        # so ids follow the order of emails.
+        username = '%08d%s' % (next(_created), hashlib.sha1(email).hexdigest()[:22])
+        users.append(User(username=username, email=email,
+                          password=get_password_hash(password), date_joined=now, last_login=now,
+                          first_name=first_name % i if '%d' in first_name else first_name,
+                          last_name=last_name % i if '%d' in last_name else last_name))
+    for start in xrange(0, len(users), BULK_INSERT_SIZE):
+        User.objects.bulk_create(users[start:start + BULK_INSERT_SIZE])
+        # SQLite does not return ids of inserted rows.
+        chunk = users[start:start + BULK_INSERT_SIZE]
+        ids = dict(User.objects.filter(username__in=[user.username for user in chunk]).values_list('username', 'pk'))
+        for user in chunk:
+            user.pk = ids[user.username]
+
+    profiles = [UserProfile(user=user, subscribed=subscribed,
+                            verification_key=UserProfile.VERIFIED if verified else
+                            UserProfile.objects._create_verification_key(user)) for user in users]
+    for start in xrange(0, len(profiles), BULK_INSERT_SIZE):
+        chunk = profiles[start:start + BULK_INSERT_SIZE]
+        UserProfile.objects.bulk_create(chunk)
+        ids = dict(UserProfile.objects.filter(user__in=[profile.user_id for profile in chunk]).values_list('user', 'pk'))
+        for profile in chunk:
+            profile.pk = ids[profile.user_id]
+    for user, profile in zip(users, profiles):
+        profile._loaded_state = (verified, subscribed)
+        user._profile_cache = profile
+        email_filter.add(user)
+        # Ids are reused after the rollback of a test, the cache may hold a user of an earlier test.
+        user_cache.invalidate(user.pk)
+
+    UserStat.objects.increment(UserStat.USERS, len(users))
+    UserStat.objects.increment(UserStat.registrations_key(UserStat.date_of(now)), len(users))
+    UserStat.objects.increment(UserStat.PROFILES, len(profiles))
+    if verified:
+        UserStat.objects.increment(UserStat.VERIFIED, len(profiles))
+    if subscribed:
+        UserStat.objects.increment(UserStat.SUBSCRIBED, len(profiles))
+    return users
+
+def create_user(email, password, first_name, last_name, **kwargs):
+    return create_users([email], password, first_name, last_name, **kwargs)[0]
@@ -1,8 +1,10 @@
 from django.contrib.auth.models import User
+from django.contrib.auth import authenticate
 from django.test import TestCase
 
 from service.models import UserProfile
 from service.forms import RegistrationForm, PasswordChangeForm, SubscribeForm
+from service.tests.factories import create_user
 
 class RegistrationFormTests(TestCase):
     """
@@ -95,6 +97,29 @@ class RegistrationFormTests(TestCase):
         )
         self.assertTrue(form.is_valid())
 
+    def test_registration_email_case(self):
+        """
+        Emails are stored in lower case, users log in with the email in any case.
+        """
+        form = RegistrationForm(data={'email': 'TXTR@txtr.com',
+                                      'first_name': self.user_data['first_name'],
+                                      'last_name': self.user_data['last_name'],
+                                      'password1': self.user_data['password'],
+                                      'password2': self.user_data['password']}
+        )
+        self.assertTrue(form.is_valid())
+        user = form.register(False)
+        self.assertEqual(user.email, 'txtr@txtr.com')
+        self.assertEqual(authenticate(username='Txtr@txtr.com', password=self.user_data['password']), user)
+
+        form = RegistrationForm(data={'email': 'Txtr@txtr.com',
+                                      'first_name': self.user_data['first_name'],
+                                      'last_name': self.user_data['last_name'],
+                                      'password1': self.user_data['password'],
+                                      'password2': self.user_data['password']}
+        )
+        self.assertFalse(form.is_valid())
+
 
 class PasswordChangeFormTests(TestCase):
     """
@@ -106,7 +131,7 @@ class PasswordChangeFormTests(TestCase):
                  'last_name': 'last_name',}
 
     def setUp(self):
-        self.user = UserProfile.objects.create_user(**self.user_data)
+        self.user = create_user(**self.user_data)
 
     def tearDown(self):
         self.user = None
@@ -149,7 +174,7 @@ class SubscribeFormTests(TestCase):
                  'last_name': 'last_name',}
 
     def setUp(self):
-        self.user = UserProfile.objects.create_user(**self.user_data)
+        self.user = create_user(**self.user_data)
 
     def tearDown(self):
         self.user = None
@@ -0,0 +1,75 @@
+from datetime import timedelta
+from django.contrib.auth.models import User
+from django.contrib.sessions.backends.db import SessionStore
+from django.contrib.sessions.models import Session
+from django.test import TestCase
+from django.test.utils import override_settings
+from django.utils import timezone
+
+from service.maintenance import Scheduler, ExpiredSessionsJob, UnverifiedUsersJob, LoginActivityJob, get_jobs
+from service.models import UserProfile, LoginActivity, UserStat
+
+@override_settings(MAINTENANCE_BATCH_PAUSE=0)
+class MaintenanceTests(TestCase):
+    """
+    Test the housekeeping jobs.
+    """
+    def test_expired_sessions(self):
+        """
+        Expired sessions are deleted in batches.
+        """
+        for i in range(5):
+            session = SessionStore()
+            session.set_expiry(-60 if i < 4 else 60)
+            session.save()
+
+        with override_settings(MAINTENANCE_BATCH_SIZE=3):
+            report = Scheduler([ExpiredSessionsJob()]).run_pending()[0]
+        self.assertEqual((report.rows, report.batches), (4, 2))
+        self.assertEqual(Session.objects.count(), 1)
+
+    @override_settings(UNVERIFIED_USER_TTL_DAYS=7)
+    def test_unverified_users(self):
+        """
+        Users who did not verify the email in time are deleted.
+        """
+        users = [UserProfile.objects.create_user('txtr%d@txtr.com' % i, 'txtr_password1', 'first', 'last')
+                 for i in range(3)]
+        UserProfile.objects.verification(users[0].profile.verification_key)
+        User.objects.filter(pk__in=[users[0].pk, users[1].pk]).update(date_joined=timezone.now() - timedelta(days=8))
+
+        report = Scheduler([UnverifiedUsersJob()]).run_pending()[0]
+        self.assertEqual(report.rows, 1)
+        self.assertEqual(sorted(User.objects.values_list('pk', flat=True)), [users[0].pk, users[2].pk])
+        self.assertEqual(UserStat.objects.get_value(UserStat.USERS), 2)
+
+    def test_login_activity(self):
+        """
+        Old login activity is deleted, unverified users are kept by default.
+        """
+        now = timezone.now()
+        LoginActivity.objects.bulk_create([LoginActivity(email='txtr@txtr.com', created=now - timedelta(days=91)),
+                                           LoginActivity(email='txtr@txtr.com', created=now)])
+        reports = Scheduler(get_jobs()).run_pending()
+
+        self.assertEqual([report.name for report in reports], ['sessions', 'login_activity', 'resend_verification', 'event_log', 'analyze'])
+        self.assertEqual(reports[1].rows, 1)
+        self.assertEqual(LoginActivity.objects.get().created, now)
+
+    def test_intervals(self):
+        """
+        A job is not run again before its interval has passed.
+        """
+        scheduler = Scheduler([LoginActivityJob()])
+        self.assertEqual(len(scheduler.run_pending()), 1)
+        self.assertEqual(scheduler.run_pending(), [])
+        self.assertTrue(scheduler.seconds_to_next_run() > 0)
+
+    def test_disabled_jobs_scheduled(self):
+        """
+        Disabled jobs (e.g. unverified_users by default) wait for their interval too,
+        so the scheduler does not spin.
+        """
+        scheduler = Scheduler(get_jobs())
+        scheduler.run_pending()
+        self.assertTrue(scheduler.seconds_to_next_run() > 0)
@@ -1,8 +1,15 @@
 import re
+import sys
+from datetime import timedelta
 from django.core import mail
 from django.contrib.auth.models import User
 from django.test import TestCase
+from django.test.utils import override_settings
+from django.conf import settings
+from django.core.urlresolvers import reverse
 
+from service.mail import MailDispatcher, dispatcher, clear_compiled_templates, get_compiled_template, _compiled_templates
+from txtr.warmup import compile_templates
 from service.models import UserProfile
 
 class UserProfileModelTests(TestCase):
@@ -90,4 +97,88 @@ class UserProfileModelTests(TestCase):
         """
         new_user = UserProfile.objects.create_user(**self.user_data)
         updated_user = UserProfile.objects.verification(new_user.profile.verification_key)
-        self.assertTrue(updated_user.profile.is_verified)
\ No newline at end of file
+        self.assertTrue(updated_user.profile.is_verified)
+
+    def test_verification_email(self):
+        """
+        Verification email has a plain text part without html tags and an html alternative.
+        """
+        new_user = UserProfile.objects.create_user(**self.user_data)
+        message = mail.outbox[0]
+        verification_url = reverse('verification', kwargs={'key': new_user.profile.verification_key})
+
+        self.assertTrue(verification_url in message.body)
+        self.assertFalse('<' in message.body)
+        self.assertEqual(message.alternatives[0][1], 'text/html')
+        self.assertTrue('href="%s%s"' % (settings.HOST, verification_url) in message.alternatives[0][0])
+
+    @override_settings(EMAIL_ASYNC=True)
+    def test_create_user_email_async(self):
+        """
+        Verification email is sent from the background thread.
+        """
+        new_user = UserProfile.objects.create_user(**self.user_data)
+        dispatcher.flush()
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertEqual(mail.outbox[0].to, [new_user.email])
+
+    @override_settings(EMAIL_ASYNC=True)
+    def test_email_sync_without_uwsgi_threads(self):
+        """
+        Emails are sent synchronously in a uWSGI worker without enable-threads.
+        """
+        sys.modules['uwsgi'] = type(sys)('uwsgi')
+        sys.modules['uwsgi'].opt = {}
+        try:
+            MailDispatcher().send(mail.EmailMessage('subject', 'body', to=['txtr@txtr.com']))
+        finally:
+            del sys.modules['uwsgi']
+        self.assertEqual(len(mail.outbox), 1)
+
+    def test_resend_verification(self):
+        """
+        Repeated resends within the window send one email with the existing key, verified profiles get none.
+        """
+        new_user = UserProfile.objects.create_user(**self.user_data)
+        key = new_user.profile.verification_key
+        mail.outbox = []
+        for i in range(5):
+            UserProfile.objects.resend_verification(UserProfile.objects.filter(user=new_user))
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertTrue(key in mail.outbox[0].body)
+        self.assertEqual(UserProfile.objects.get(user=new_user).verification_key, key)
+
+        # The window is over.
+        sent = UserProfile.objects.get(user=new_user).verification_sent
+        UserProfile.objects.filter(user=new_user).update(
+            verification_sent=sent - timedelta(seconds=settings.VERIFICATION_RESEND_WINDOW))
+        self.assertEqual(UserProfile.objects.resend_verification(UserProfile.objects.filter(user=new_user)), 1)
+        self.assertTrue(UserProfile.objects.get(user=new_user).verification_sent >= sent)
+        UserProfile.objects.filter(user=new_user).update(verification_sent=None)
+        UserProfile.objects.verification(key)
+        self.assertEqual(UserProfile.objects.resend_verification(UserProfile.objects.filter(user=new_user)), 0)
+
+    @override_settings(BULK_UPDATE_CHUNK_SIZE=2)
+    def test_set_subscribed_by_emails(self):
+        """
+        Subscribes users by emails in any case from a stream, unknown emails are skipped and reported.
+        """
+        for i in range(3):
+            UserProfile.objects.create_user('txtr%d@txtr.com' % i, 'password1', 'first', 'last')
+        User.objects.filter(email='txtr1@txtr.com').update(email='Txtr1@txtr.com')
+        emails = iter(['TXTR0@txtr.com', 'unknown@txtr.com', 'txtr2@txtr.com', 'Txtr1@txtr.com', 'txtr1@txtr.com'])
+
+        self.assertEqual(UserProfile.objects.set_subscribed_by_emails(emails, True), (5, 3, 3))
+        self.assertEqual(sorted(UserProfile.objects.filter(subscribed=True).values_list('user__email', flat=True)),
+            ['Txtr1@txtr.com', 'txtr0@txtr.com', 'txtr2@txtr.com'])
+        self.assertEqual(UserProfile.objects.set_subscribed_by_emails(['txtr0@txtr.com'], True), (1, 1, 0))
+
+    def test_compile_templates(self):
+        """
+        Warm-up compiles the email templates.
+        """
+        clear_compiled_templates()
+        compile_templates()
+        self.assertTrue(get_compiled_template('service/mail/verification_email.txt') is
+            get_compiled_template('service/mail/verification_email.txt'))
+        self.assertTrue('service/mail/verification_email.html' in _compiled_templates)
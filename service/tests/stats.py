@@ -0,0 +1,87 @@
+import json
+from StringIO import StringIO
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.core.urlresolvers import reverse
+from django.test import TestCase
+from django.utils import timezone
+
+from service.activity import recorder
+from service.api import create_token
+from service.forms import SubscribeForm
+from service.models import UserProfile, UserStat
+from service.tests.factories import create_users
+
+class UserStatTests(TestCase):
+    """
+    Test the user statistics counters.
+    """
+    def setUp(self):
+        self.users = create_users(['txtr%d@txtr.com' % i for i in range(3)])
+
+    def tearDown(self):
+        self.users = None
+        # Logins of the test client are buffered.
+        recorder.clear()
+
+    def stats(self):
+        return UserStat.objects.get_values([UserStat.USERS, UserStat.VERIFIED, UserStat.SUBSCRIBED,
+                                            UserStat.registrations_key(UserStat.date_of(timezone.now()))])
+
+    def test_counters(self):
+        """
+        Counters follow registration, verification, subscription and deletion,
+        registrations are kept for deleted users.
+        """
+        registrations_key = UserStat.registrations_key(UserStat.date_of(timezone.now()))
+        self.assertEqual(self.stats(), {'users': 3, 'verified': 0, 'subscribed': 0, registrations_key: 3})
+
+        UserProfile.objects.verification(self.users[0].profile.verification_key)
+        UserProfile.objects.verification(self.users[0].profile.verification_key)
+        form = SubscribeForm(self.users[1], {'subscribe': True})
+        form.is_valid()
+        form.save()
+        form.save()
+        UserProfile.objects.set_subscribed([user.pk for user in self.users], True)
+        self.assertEqual(self.stats(), {'users': 3, 'verified': 1, 'subscribed': 3, registrations_key: 3})
+
+        User.objects.get(pk=self.users[0].pk).delete()
+        self.assertEqual(self.stats(), {'users': 2, 'verified': 0, 'subscribed': 2, registrations_key: 3})
+
+    def test_reconcile(self):
+        """
+        Reconciliation recounts counters changed behind the ORM.
+        """
+        UserProfile.objects.filter(pk=self.users[0].profile.pk).update(subscribed=True)
+        UserStat.objects.filter(key=UserStat.USERS).update(value=10)
+        UserStat.objects.increment('registrations:2000-01-01', 5)
+
+        stdout = StringIO()
+        call_command('reconcile_user_stats', stdout=stdout)
+        self.assertTrue('2 counters corrected' in stdout.getvalue())
+        self.assertEqual(UserStat.objects.get_value(UserStat.USERS), 3)
+        self.assertEqual(UserStat.objects.get_value(UserStat.SUBSCRIBED), 1)
+        self.assertEqual(UserStat.objects.get_value('registrations:2000-01-01'), 5)
+
+    def test_api(self):
+        """
+        Stats endpoint returns counters to staff.
+        """
+        User.objects.filter(pk=self.users[0].pk).update(is_staff=True)
+        response = self.client.get(reverse('api_user_stats'), {'days': 2},
+            HTTP_AUTHORIZATION='Token %s' % create_token(self.users[0]))
+        data = json.loads(response.content)
+        self.assertEqual(data['users'], 3)
+        self.assertEqual(len(data['registrations']), 2)
+        self.assertEqual(sum(data['registrations'].values()), 3)
+
+    def test_admin_estimated_count(self):
+        """
+        Users changelist takes the number of users from the counter.
+        """
+        User.objects.create_superuser('admin', 'admin@txtr.com', 'admin1')
+        UserStat.objects.filter(key=UserStat.USERS).update(value=1000)
+        self.client.login(username='admin@txtr.com', password='admin1')
+        response = self.client.get(reverse('admin:auth_user_changelist'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['cl'].result_count, 1000)
@@ -1,8 +1,13 @@
 from django.contrib.auth.models import User
+from django.conf import settings
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import override_settings
 from django.core import mail
+from service.activity import recorder
 from service.models import UserProfile
 from service.forms import RegistrationForm, PasswordChangeForm, SubscribeForm, EmailAuthenticationForm
+from service.tests.factories import create_user
 from django.core.urlresolvers import reverse
 
 class ViewTests(TestCase):
@@ -14,12 +19,14 @@ class ViewTests(TestCase):
                  'first_name': 'first_name',
                  'last_name': 'last_name',}
     def setUp(self):
-        self.user = UserProfile.objects.create_user(**self.user_data)
+        self.user = create_user(**self.user_data)
         mail.outbox = []
 
     def tearDown(self):
         self.user = None
         mail.outbox = []
+        # Logins of the test client are buffered.
+        recorder.clear()
 
     def test_home_user_logged(self):
         """
@@ -170,4 +177,97 @@ class ViewTests(TestCase):
             },
         )
         self.assertRedirects(response, 'http://testserver%s' % reverse('settings'))
-        self.assertTrue(UserProfile.objects.get(user__email=self.user_data['email']).subscribed)
\ No newline at end of file
+        self.assertTrue(UserProfile.objects.get(user__email=self.user_data['email']).subscribed)
+
+    def test_settings_task_resend_verification(self):
+        """
+        POST to settings view with resend_verification task.
+        """
+        self.client.login(username=self.user_data['email'], password=self.user_data['password'])
+        for i in range(3):
+            response = self.client.post(reverse('settings'), data={'task': 'resend_verification'})
+            self.assertRedirects(response, 'http://testserver%s' % reverse('settings'))
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertEqual(mail.outbox[0].to, [self.user_data['email']])
+
+    def test_settings_verification_banner(self):
+        """
+        Settings page shows the verification banner until the email is verified.
+        """
+        self.client.login(username=self.user_data['email'], password=self.user_data['password'])
+        response = self.client.get(reverse('settings'))
+        self.assertContains(response, 'You still need to verify your email.')
+
+        UserProfile.objects.verification(self.user.profile.verification_key)
+        response = self.client.get(reverse('settings'))
+        self.assertNotContains(response, 'You still need to verify your email.')
+
+    def test_read_only_requests_without_writes(self):
+        """
+        GET of the pages neither writes to the database nor updates the session.
+        """
+        self.client.login(username=self.user_data['email'], password=self.user_data['password'])
+        for name in ('home', 'settings'):
+            with override_settings(DEBUG=True):
+                connection.queries = []
+                response = self.client.get(reverse(name))
+                writes = [query['sql'] for query in connection.queries if not query['sql'].startswith('SELECT')]
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(writes, [])
+            self.assertFalse(settings.SESSION_COOKIE_NAME in response.cookies)
+
+    def test_home_conditional_get(self):
+        """
+        Home page has a weak ETag, the client gets 304 until the page changes.
+        """
+        self.client.login(username=self.user_data['email'], password=self.user_data['password'])
+        response = self.client.get(reverse('home'))
+        etag = response['ETag']
+        self.assertTrue(etag.startswith('W/"'))
+        self.assertTrue('no-cache' in response['Cache-Control'] and 'private' in response['Cache-Control'])
+
+        response = self.client.get(reverse('home'), HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.content, '')
+        self.assertEqual(response['ETag'], etag)
+
+        user = User.objects.get(pk=self.user.pk)
+        user.last_name = 'changed'
+        user.save()
+        response = self.client.get(reverse('home'), HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_home_with_messages_not_cached(self):
+        """
+        Pages with flash messages have no ETag.
+        """
+        self.client.login(username=self.user_data['email'], password=self.user_data['password'])
+        self.client.get(reverse('verification', kwargs={'key': self.user.profile.verification_key}))
+        response = self.client.get(reverse('home'))
+        self.assertContains(response, 'Your email was verified.')
+        self.assertFalse(response.has_header('ETag'))
+
+    def test_compression(self):
+        """
+        Pages are compressed for clients that accept gzip, short pages and pages with
+        the CSRF token are not.
+        """
+        self.client.login(username=self.user_data['email'], password=self.user_data['password'])
+        plain = self.client.get(reverse('home'))
+        self.assertFalse(plain.has_header('Content-Encoding'))
+        response = self.client.get(reverse('home'), HTTP_ACCEPT_ENCODING='gzip, deflate')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertTrue(len(response.content) < len(plain.content))
+        self.assertTrue('Accept-Encoding' in response['Vary'])
+
+        with override_settings(COMPRESSION_MIN_SIZE=len(plain.content) + 1):
+            response = self.client.get(reverse('home'), HTTP_ACCEPT_ENCODING='gzip')
+        self.assertFalse(response.has_header('Content-Encoding'))
+
+        response = self.client.get(reverse('settings'), HTTP_ACCEPT_ENCODING='gzip')
+        self.assertContains(response, 'csrfmiddlewaretoken')
+        self.assertFalse(response.has_header('Content-Encoding'))
+        self.client.logout()
+        response = self.client.get(reverse('login'), {'next': '/settings/'}, HTTP_ACCEPT_ENCODING='gzip')
+        self.assertFalse(response.has_header('Content-Encoding'))
@@ -1,5 +1,6 @@
 from django.conf.urls import patterns, url
 from service.views import home, login_user, logout_user, user_settings, registration, verification
+from service import api
 
 urlpatterns = patterns('',
     url(r'^$', home, name="home"),
@@ -8,4 +9,15 @@ urlpatterns = patterns('',
     url(r'^settings/$',  user_settings, name='settings'),
     url(r'^registration/$', registration, name="registration"),
     url(r'^verification/(?P<key>\w*)$', verification, name="verification"),
+
+    url(r'^api/register/$', api.register, name='api_register'),
+    url(r'^api/authenticate/$', api.authenticate, name='api_authenticate'),
+    url(r'^api/verify/$', api.verify, name='api_verify'),
+    url(r'^api/password/$', api.change_password, name='api_change_password'),
+    url(r'^api/verify/resend/$', api.resend_verification, name='api_resend_verification'),
+    url(r'^api/subscribe/$', api.subscribe, name='api_subscribe'),
+    url(r'^api/subscribe/batch/$', api.subscribe_batch, name='api_subscribe_batch'),
+    url(r'^api/stats/cache/$', api.cache_stats, name='api_cache_stats'),
+    url(r'^api/stats/users/$', api.user_stats, name='api_user_stats'),
+    url(r'^api/events/$', api.events, name='api_events'),
 )
@@ -7,10 +7,24 @@ from django.contrib.auth import login, logout
 from django.template import RequestContext
 from django.core.urlresolvers import reverse
 from service.models import UserProfile
-from service.derorators import anonymous_required
+from service.derorators import anonymous_required, weak_etag, template_version
+from service.activity import record_failed_login
 from django.contrib import messages
+from django.views.decorators.cache import cache_control, never_cache
 
+def _home_version(request, **kwargs):
+    """
+    The home page shows only the user's name. Pages with flash messages are not cached.
+    """
+    if len(messages.get_messages(request)):
+        return None
+    user = request.user
+    return u'%s:%d:%s:%s' % (template_version('service/home.html', 'service/base.html'),
+                             user.pk, user.first_name, user.last_name)
+
+@cache_control(private=True, no_cache=True)
 @login_required
+@weak_etag(_home_version)
 def home(request, **kwargs):
 
     context = {}
@@ -21,6 +35,7 @@ def home(request, **kwargs):
 
     return render_to_response('service/home.html', context, context_instance=RequestContext(request))
 
+@never_cache
 @anonymous_required()
 def login_user(request, **kwargs):
 
@@ -32,6 +47,7 @@ def login_user(request, **kwargs):
             if user and user.is_active:
                 login(request, user)
             return HttpResponseRedirect(next)
+        record_failed_login(request, request.POST.get('username'))
     else:
         form = EmailAuthenticationForm()
     context = {
@@ -42,11 +58,13 @@ def login_user(request, **kwargs):
     return render_to_response("service/login.html", context, context_instance=RequestContext(request))
 
 
+@never_cache
 def logout_user(request, **kwargs):
 
     logout(request)
     return HttpResponseRedirect(reverse('home'))
 
+@never_cache
 @login_required
 def user_settings(request, **kwargs):
     """
@@ -55,12 +73,11 @@ def user_settings(request, **kwargs):
     tasks = {
         'change_password' : _change_password,
         'subscribe' : _subscribe,
+        'resend_verification' : _resend_verification,
     }
     if request.method == "POST":
         response = tasks.get(request.POST.get('task'))(request)
     else:
-        if not request.user.profile.is_verified:
-            messages.warning(request, 'You still need to verified you email.')
         context = {
             'change_password_form' :PasswordChangeForm(request.user),
             'subscribe_form' :SubscribeForm(request.user),
@@ -96,6 +113,19 @@ def _subscribe(request):
         return HttpResponseRedirect(reverse('settings'))
     return render_to_response("service/settings.html", context, context_instance=RequestContext(request))
 
+def _resend_verification(request):
+    """
+    Resending the verification email from the settings page
+    """
+    profiles = UserProfile.objects.filter(user=request.user).exclude(verification_key=UserProfile.VERIFIED)
+    if profiles.exists():
+        UserProfile.objects.resend_verification(profiles)
+        messages.info(request, 'Verification email was sent.')
+    else:
+        messages.info(request, 'Your email is already verified.')
+    return HttpResponseRedirect(reverse('settings'))
+
+@never_cache
 @anonymous_required()
 def registration(request, **kwargs):
 
@@ -114,6 +144,7 @@ def registration(request, **kwargs):
     context.update(csrf(request))
     return render_to_response("service/registration.html", context, context_instance=RequestContext(request))
 
+@never_cache
 def verification(request, **kwargs):
 
     if UserProfile.objects.verification(kwargs['key']):
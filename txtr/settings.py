@@ -1,5 +1,6 @@
 # Django settings for txtr project.]
-from os.path import dirname, realpath
+from os.path import dirname, realpath, join
+from tempfile import gettempdir
 
 DEBUG = True
 TEMPLATE_DEBUG = DEBUG
@@ -21,11 +22,91 @@ EMAIL_HOST_USER = 'igor.veremchuk.test@gmail.com'
 EMAIL_HOST_PASSWORD = 'igor12345'
 EMAIL_PORT = 587
 EMAIL_FROM_DEFAULT = 'no-raply@txtr.com'
+# Send emails from a background thread (uWSGI needs enable-threads = true).
+EMAIL_ASYNC = not DEBUG
+# Max number of queued emails sent through one SMTP connection.
+EMAIL_BATCH_SIZE = 100
 
 HOST = "http://avtobazar.ua:8080"
 
 LOGIN_URL = '/login/'
 
+# Lifetime of the API tokens, in seconds.
+API_TOKEN_MAX_AGE = 60 * 60 * 24 * 30
+
+# Max number of ids in one bulk UPDATE (SQLite allows 999 query parameters).
+BULK_UPDATE_CHUNK_SIZE = 500
+
+# Directory for the files of state shared between worker processes of the node.
+SHARED_STATE_DIR = join(ROOT, 'var', 'shared')
+
+# Bloom filter of user emails, it lets registration and login skip the database for unknown emails.
+EMAIL_FILTER_ENABLED = True
+EMAIL_FILTER_CAPACITY = 1000000
+EMAIL_FILTER_ERROR_RATE = 0.001
+
+# Corpus of breached passwords built by 'manage.py build_breached_passwords', None disables the check.
+BREACHED_PASSWORDS_FILE = None
+
+# Login activity and last_login are written in batches. A crashed worker loses at most
+# LOGIN_ACTIVITY_BUFFER_SIZE events, 1 writes every event immediately.
+LOGIN_ACTIVITY_BUFFER_SIZE = 100
+LOGIN_ACTIVITY_FLUSH_INTERVAL = 5
+# Flush buffered login activity older than the interval from a background thread of every worker,
+# otherwise only on the next login.
+LOGIN_ACTIVITY_FLUSH_THREAD = True
+
+# Days to keep login activity.
+LOGIN_ACTIVITY_RETENTION_DAYS = 90
+
+# Verification emails resent to a user within this many seconds are sent once.
+VERIFICATION_RESEND_WINDOW = 10 * 60
+# Admin selections of more profiles are resent in the background by 'manage.py maintenance'.
+VERIFICATION_RESEND_ADMIN_LIMIT = 100
+
+# Days after which users who did not verify the email are deleted, None keeps them.
+UNVERIFIED_USER_TTL_DAYS = None
+
+# Log of user lifecycle events for downstream consumers (see service.events), None disables it.
+# Events are synced to the disk after EVENT_LOG_FSYNC_EVENTS events or EVENT_LOG_FSYNC_INTERVAL seconds,
+# segments are rolled over at EVENT_LOG_SEGMENT_SIZE bytes and deleted after EVENT_LOG_RETENTION_DAYS days.
+EVENT_LOG_DIR = join(ROOT, 'var', 'events')
+EVENT_LOG_SEGMENT_SIZE = 64 * 1024 * 1024
+EVENT_LOG_FSYNC_EVENTS = 100
+EVENT_LOG_FSYNC_INTERVAL = 1
+EVENT_LOG_RETENTION_DAYS = 30
+
+# Max seconds a long-polling consumer of the event log waits for new events. The request
+# holds a worker meanwhile, so keep it short or route /api/events/ to its own worker pool.
+EVENT_LOG_MAX_WAIT = 5
+
+# 'manage.py maintenance': max rows per batch, target write lock time of a batch and pause
+# between batches (seconds), max run time of a job (seconds) and job intervals (seconds).
+MAINTENANCE_BATCH_SIZE = 500
+MAINTENANCE_LOCK_TARGET = 0.005
+MAINTENANCE_BATCH_PAUSE = 0.05
+MAINTENANCE_JOB_TIME = 10
+MAINTENANCE_INTERVALS = {
+    'sessions': 60 * 60,
+    'unverified_users': 60 * 60,
+    'login_activity': 60 * 60,
+    'analyze': 24 * 60 * 60,
+    'incremental_vacuum': 60 * 60,
+    'event_log': 60 * 60,
+    'resend_verification': 60,
+}
+
+# Shared (L2) cache, use memcached in production.
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    }
+}
+
+# In-process (L1) cache of authenticated users: max number of users and lifetime in seconds.
+USER_CACHE_SIZE = 10000
+USER_CACHE_TTL = 60
+
 MANAGERS = ADMINS
 
 DATABASES = {
@@ -109,10 +190,18 @@ TEMPLATE_LOADERS = (
     'django.template.loaders.app_directories.Loader',
 #     'django.template.loaders.eggs.Loader',
 )
+if not DEBUG:
+    # Keep compiled templates in memory.
+    TEMPLATE_LOADERS = (('django.template.loaders.cached.Loader', TEMPLATE_LOADERS),)
+
+# Warm up the application when the WSGI module is imported, i.e. in the uWSGI master
+# before the workers are forked (see txtr.warmup).
+PRELOAD_APPLICATION = not DEBUG
 
 MIDDLEWARE_CLASSES = (
+    'service.middleware.CompressionMiddleware',
     'django.middleware.common.CommonMiddleware',
-    'django.contrib.sessions.middleware.SessionMiddleware',
+    'service.middleware.SessionMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
@@ -120,6 +209,16 @@ MIDDLEWARE_CLASSES = (
     # 'django.middleware.clickjacking.XFrameOptionsMiddleware',
 )
 
+# Text responses of at least COMPRESSION_MIN_SIZE bytes are compressed with brotli
+# (if the brotli package is installed) or gzip.
+COMPRESSION_MIN_SIZE = 512
+COMPRESSION_BROTLI_QUALITY = 5
+
+# Sessions are written only when their data change, flash messages are kept in a cookie,
+# so read-only page views do not write to the database.
+SESSION_ENGINE = 'service.sessions'
+MESSAGE_STORAGE = 'django.contrib.messages.storage.cookie.CookieStorage'
+
 ROOT_URLCONF = 'txtr.urls'
 
 # Python dotted path to the WSGI application used by Django's runserver.
@@ -143,14 +242,13 @@ INSTALLED_APPS = (
     # Uncomment the next line to enable admin documentation:
     # 'django.contrib.admindocs',
     'service',
-    'django_jenkins',
 )
 
-JENKINS_TASKS = ('django_jenkins.tasks.run_pylint',
-                 'django_jenkins.tasks.run_pep8',
-                 'django_jenkins.tasks.run_pyflakes',
-                 'django_jenkins.tasks.with_coverage',
-                 'django_jenkins.tasks.django_tests',)
+# Tests run in TEST_PROCESSES processes (number of CPUs if None) against copies of
+# an in-memory SQLite database, which is loaded from TEST_DB_SNAPSHOT when the schema has not changed.
+TEST_RUNNER = 'txtr.test_runner.ParallelTestSuiteRunner'
+TEST_PROCESSES = None
+TEST_DB_SNAPSHOT = join(gettempdir(), 'txtr', 'test_db.sql')
 
 # A sample logging configuration. The only tangible logging
 # performed by this configuration is to send an email to
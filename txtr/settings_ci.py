@@ -0,0 +1,12 @@
+# Settings for the CI server: python manage.py jenkins --settings=txtr.settings_ci
+from txtr.settings import *
+
+INSTALLED_APPS += (
+    'django_jenkins',
+)
+
+JENKINS_TASKS = ('django_jenkins.tasks.run_pylint',
+                 'django_jenkins.tasks.run_pep8',
+                 'django_jenkins.tasks.run_pyflakes',
+                 'django_jenkins.tasks.with_coverage',
+                 'django_jenkins.tasks.django_tests',)
@@ -0,0 +1,178 @@
+"""
+Test runner that shards test classes across processes.
+
+The test database is SQLite in memory. It's created once from a snapshot of the schema
+(TEST_DB_SNAPSHOT), which is rebuilt with syncdb only when models or custom SQL change.
+Worker processes are forked after the database is set up, so every worker gets its own
+copy of the database and of the state shared between processes of the node.
+"""
+import hashlib
+import multiprocessing
+import os
+import Queue
+import shutil
+import sys
+import time
+import traceback
+import unittest
+from StringIO import StringIO
+from tempfile import mkdtemp
+from django.conf import settings
+from django.db import connections, DEFAULT_DB_ALIAS
+from django.db.models import get_apps
+from django.test.simple import DjangoTestSuiteRunner
+import django
+
+class ParallelTestSuiteRunner(DjangoTestSuiteRunner):
+    """
+    Runs test classes in TEST_PROCESSES worker processes (number of CPUs if None).
+    Falls back to a serial run when the test database is not SQLite in memory.
+    """
+    def setup_test_environment(self, **kwargs):
+        super(ParallelTestSuiteRunner, self).setup_test_environment(**kwargs)
+        self._state_dir = mkdtemp(prefix='txtr-tests-')
+        settings.SHARED_STATE_DIR = os.path.join(self._state_dir, 'shared')
+        settings.EVENT_LOG_DIR = os.path.join(self._state_dir, 'events')
+        # The thread's own connection would not see the in-memory test database.
+        settings.LOGIN_ACTIVITY_FLUSH_THREAD = False
+
+    def teardown_test_environment(self, **kwargs):
+        shutil.rmtree(self._state_dir, ignore_errors=True)
+        super(ParallelTestSuiteRunner, self).teardown_test_environment(**kwargs)
+
+    def setup_databases(self, **kwargs):
+        if not self._in_memory():
+            return super(ParallelTestSuiteRunner, self).setup_databases(**kwargs)
+        connection = connections[DEFAULT_DB_ALIAS]
+        key = '-- %s\n' % self._snapshot_key()
+        try:
+            with open(settings.TEST_DB_SNAPSHOT, 'rb') as snapshot:
+                dump = snapshot.read() if snapshot.readline() == key else None
+        except IOError:
+            dump = None
+        if dump is None:
+            old_config = super(ParallelTestSuiteRunner, self).setup_databases(**kwargs)
+            self._save_snapshot(key + '\n'.join(connection.connection.iterdump()))
+            return old_config
+
+        if self.verbosity >= 1:
+            print "Loading test database snapshot for alias '%s'..." % DEFAULT_DB_ALIAS
+        old_name = connection.settings_dict['NAME']
+        connection.close()
+        connection.settings_dict['NAME'] = ':memory:'
+        connection.cursor()
+        connection.connection.executescript(dump)
+        return [(connection, old_name, True)], []
+
+    def run_suite(self, suite, **kwargs):
+        processes = settings.TEST_PROCESSES or multiprocessing.cpu_count()
+        shards = self._shard(suite, processes)
+        if not self._in_memory() or len(shards) < 2:
+            return super(ParallelTestSuiteRunner, self).run_suite(suite, **kwargs)
+
+        started = time.time()
+        queue = multiprocessing.Queue()
+        workers = [multiprocessing.Process(target=self._run_shard, args=(i, shard, queue))
+                   for i, shard in enumerate(shards)]
+        for worker in workers:
+            worker.start()
+        reports = self._collect_reports(workers, queue)
+        for worker in workers:
+            worker.join()
+
+        result = unittest.TestResult()
+        for report in sorted(reports):
+            if self.verbosity >= 2 or report[3] or report[4]:
+                sys.stderr.write(report[1])
+            result.testsRun += report[2]
+            result.failures.extend(report[3])
+            result.errors.extend(report[4])
+        sys.stderr.write('%s\nRan %d tests in %.3fs in %d processes\n\n%s\n' % (
+            '-' * 70, result.testsRun, time.time() - started, len(workers), 'OK' if result.wasSuccessful() else
+            'FAILED (failures=%d, errors=%d)' % (len(result.failures), len(result.errors))))
+        return result
+
+    def _run_shard(self, index, shard, queue):
+        """
+        Runs the tests in a worker process and puts (index, output, tests run, failures, errors) to the queue.
+        """
+        stream = StringIO()
+        try:
+            settings.SHARED_STATE_DIR = os.path.join(self._state_dir, 'shared-%d' % index)
+            settings.EVENT_LOG_DIR = os.path.join(self._state_dir, 'events-%d' % index)
+            result = unittest.TextTestRunner(stream=stream, verbosity=self.verbosity, failfast=self.failfast).run(shard)
+            queue.put((index, stream.getvalue(), result.testsRun,
+                       [(str(test), error) for test, error in result.failures],
+                       [(str(test), error) for test, error in result.errors]))
+        except Exception:
+            queue.put((index, stream.getvalue(), 0, [], [('worker %d' % index, traceback.format_exc())]))
+
+    def _collect_reports(self, workers, queue):
+        """
+        Returns a report of every worker, a worker which exited without one reports an error.
+        """
+        reports = {}
+        while len(reports) < len(workers):
+            # Exit codes are checked before the queue, a report is put before the worker exits.
+            exited = [i for i, worker in enumerate(workers) if worker.exitcode is not None]
+            try:
+                report = queue.get(timeout=1)
+                reports[report[0]] = report
+                continue
+            except Queue.Empty:
+                pass
+            for i in exited:
+                if i not in reports:
+                    reports[i] = (i, '', 0, [], [('worker %d' % i, 'Exited with code %s without a report\n' % workers[i].exitcode)])
+        return reports.values()
+
+    def _shard(self, suite, processes):
+        """
+        Splits the tests into at most 'processes' suites, tests of a class stay together.
+        """
+        classes = {}
+        for test in self._iter_tests(suite):
+            classes.setdefault(test.__class__, []).append(test)
+        shards = [[] for i in range(min(processes, len(classes)))]
+        for tests in sorted(classes.values(), key=len, reverse=True):
+            min(shards, key=len).extend(tests)
+        return [unittest.TestSuite(tests) for tests in shards]
+
+    def _iter_tests(self, suite):
+        for test in suite:
+            if isinstance(test, unittest.TestSuite):
+                for subtest in self._iter_tests(test):
+                    yield subtest
+            else:
+                yield test
+
+    def _in_memory(self):
+        if len(connections.databases) != 1:
+            return False
+        connection = connections[DEFAULT_DB_ALIAS]
+        return connection.vendor == 'sqlite' and connection.creation._get_test_db_name() == ':memory:'
+
+    def _snapshot_key(self):
+        """
+        Hash of everything the schema depends on: Django version, models and custom SQL of the apps.
+        """
+        digest = hashlib.md5(django.get_version())
+        for app in get_apps():
+            directory = os.path.dirname(app.__file__)
+            paths = [app.__file__.replace('.pyc', '.py')]
+            if os.path.isdir(os.path.join(directory, 'sql')):
+                paths.extend(os.path.join(directory, 'sql', name) for name in sorted(os.listdir(os.path.join(directory, 'sql'))))
+            for path in paths:
+                if os.path.isfile(path):
+                    with open(path, 'rb') as source:
+                        digest.update(source.read())
+        return digest.hexdigest()
+
+    def _save_snapshot(self, dump):
+        directory = os.path.dirname(settings.TEST_DB_SNAPSHOT)
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+        path = '%s.%d' % (settings.TEST_DB_SNAPSHOT, os.getpid())
+        with open(path, 'wb') as snapshot:
+            snapshot.write(dump.encode('utf-8'))
+        os.rename(path, settings.TEST_DB_SNAPSHOT)
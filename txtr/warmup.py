@@ -0,0 +1,60 @@
+"""
+Warm-up of the application before worker processes are forked.
+
+uWSGI imports the WSGI module in the master process (unless lazy-apps is on) and forks
+the workers afterwards, so everything loaded here is shared by the workers copy-on-write
+instead of being loaded by each worker on its first request.
+"""
+import gc
+import logging
+import os
+from django.conf import settings
+from django.core.urlresolvers import get_resolver
+from django.db import connections
+from django.template import TemplateDoesNotExist, TemplateSyntaxError
+from django.template.loader import get_template
+from django.utils import translation
+
+logger = logging.getLogger(__name__)
+
+def warm_up(application):
+    """
+    Loads middleware, views and URL patterns, compiles templates, builds in-memory indexes
+    and freezes the heap, so the garbage collector does not touch the shared pages.
+    """
+    application.load_middleware()
+    get_resolver(None).reverse_dict
+    translation.activate(settings.LANGUAGE_CODE)
+    compile_templates()
+
+    from service.bloom import email_filter
+    from service.breached import get_breached_passwords
+    email_filter.build()
+    get_breached_passwords()
+
+    # Connections must not be shared with the forked workers.
+    for connection in connections.all():
+        connection.close()
+    translation.deactivate()
+
+    gc.collect()
+    if hasattr(gc, 'freeze'):
+        gc.freeze()
+
+def compile_templates():
+    """
+    Compiles all templates of TEMPLATE_DIRS. Compiled templates are kept by the cached
+    template loader and, for emails, by service.mail.
+    """
+    from service.mail import get_compiled_template
+    for template_dir in settings.TEMPLATE_DIRS:
+        for root, dirs, files in os.walk(template_dir):
+            for file_name in files:
+                template_name = os.path.relpath(os.path.join(root, file_name), template_dir)
+                try:
+                    if template_name.startswith('service/mail/'):
+                        get_compiled_template(template_name)
+                    elif template_name.endswith('.html'):
+                        get_template(template_name)
+                except (TemplateDoesNotExist, TemplateSyntaxError):
+                    logger.exception('Failed to compile template %s', template_name)
@@ -23,6 +23,12 @@ os.environ.setdefault("DJANGO_SETTINGS_MODULE", "txtr.settings")
 from django.core.wsgi import get_wsgi_application
 application = get_wsgi_application()
 
+# Load everything before uWSGI forks the workers, see txtr.warmup.
+from django.conf import settings
+if settings.PRELOAD_APPLICATION:
+    from txtr.warmup import warm_up
+    warm_up(application)
+
 # Apply WSGI middleware here.
 # from helloworld.wsgi import HelloWorldApplication
 # application = HelloWorldApplication(application)